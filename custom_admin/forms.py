@@ -1,4 +1,84 @@
+from django import forms
+from django.db.models import Q
 from django.forms import ModelForm
 from custom_admin.models import * 
+from store.models import STATUS_CHOICES, Category
 
 
+YES_NO = (('', 'Any'), ('1', 'Yes'), ('0', 'No'))
+
+
+class ProductFilterForm(forms.Form):
+    q = forms.CharField(required=False, label='Title or SKU')
+    category = forms.ModelChoiceField(queryset=Category.objects.order_by('title'), required=False, empty_label='All categories')
+    is_active = forms.ChoiceField(choices=YES_NO, required=False, label='Active')
+    is_featured = forms.ChoiceField(choices=YES_NO, required=False, label='Featured')
+
+    def filter(self, queryset):
+        if not self.is_valid():
+            return queryset
+        data = self.cleaned_data
+        if data['q']:
+            queryset = queryset.filter(Q(title__icontains=data['q']) | Q(sku=data['q']))
+        if data['category']:
+            queryset = queryset.filter(category=data['category'])
+        for flag in ('is_active', 'is_featured'):
+            if data[flag]:
+                queryset = queryset.filter(**{flag: data[flag] == '1'})
+        return queryset
+
+
+class ProductBulkActionForm(forms.Form):
+    ACTIONS = (
+        ('activate', 'Set active'),
+        ('deactivate', 'Set inactive'),
+        ('feature', 'Set featured'),
+        ('unfeature', 'Unset featured'),
+        ('price', 'Change price by %'),
+        ('move', 'Move to category'),
+    )
+    TARGETS = (
+        ('selected', 'Selected products'),
+        ('filtered', 'All products matching the filter'),
+    )
+
+    action = forms.ChoiceField(choices=ACTIONS)
+    target = forms.ChoiceField(choices=TARGETS, initial='selected')
+    ids = forms.CharField(required=False)
+    percent = forms.DecimalField(required=False, max_digits=5, decimal_places=2, min_value=-90, max_value=500)
+    category = forms.ModelChoiceField(queryset=Category.objects.order_by('title'), required=False)
+
+    def __init__(self, data=None, **kwargs):
+        super().__init__(data, **kwargs)
+        # Checkboxes of the table post one "ids" value each
+        if data is not None and hasattr(data, 'getlist'):
+            self.selected_ids = [pk for pk in data.getlist('ids') if pk.isdigit()]
+        else:
+            self.selected_ids = []
+
+    def clean(self):
+        data = super().clean()
+        action = data.get('action')
+        if action == 'price' and data.get('percent') is None:
+            self.add_error('percent', 'Enter the percentage to apply.')
+        if action == 'move' and not data.get('category'):
+            self.add_error('category', 'Choose the category to move to.')
+        if data.get('target') == 'selected' and not self.selected_ids:
+            raise forms.ValidationError('Select at least one product.')
+        return data
+
+
+class OrderExportForm(forms.Form):
+    FORMATS = (('csv', 'CSV'), ('jsonl', 'JSON Lines'))
+
+    format = forms.ChoiceField(choices=FORMATS, initial='csv')
+    status = forms.MultipleChoiceField(choices=STATUS_CHOICES, required=False, widget=forms.CheckboxSelectMultiple,
+                                       help_text='Leave empty for every status.')
+    since = forms.DateField(required=False, label='From', widget=forms.DateInput(attrs={'type': 'date'}))
+    until = forms.DateField(required=False, label='To', widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def clean(self):
+        data = super().clean()
+        if data.get('since') and data.get('until') and data['since'] > data['until']:
+            raise forms.ValidationError('The start date is after the end date.')
+        return data
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db import migrations
+
+
+# Expression indexes for the case-insensitive prefix search of manage_users.
+# auth_user belongs to django.contrib.auth, so they cannot be declared in a
+# model Meta and are created here.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('custom_admin', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX custom_admin_username_lower_idx ON auth_user (LOWER(username))',
+            'DROP INDEX custom_admin_username_lower_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX custom_admin_email_lower_idx ON auth_user (LOWER(email))',
+            'DROP INDEX custom_admin_email_lower_idx',
+        ),
+    ]
@@ -1,3 +1,216 @@
+import csv
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from store import profiling
+from store.models import Address, Cart, Category, Order, Product
+
+
+class ManageUsersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        User.objects.bulk_create([
+            User(username='user{:03d}'.format(i), email='Person{:03d}@example.com'.format(i)) for i in range(120)
+        ])
+        shopper = User.objects.get(username='user007')
+        category = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=False)
+        product = Product.objects.create(
+            title='Ring', slug='ring', sku='R1', short_description='Gold', price=10,
+            category=category, is_active=True, is_featured=False,
+        )
+        address = Address.objects.create(user=shopper, locality='Market', city='Kampala', state='Central')
+        for _ in range(3):
+            Order.objects.create(user=shopper, address=address, product=product, quantity=1)
+        Cart.objects.create(user=shopper, product=product, quantity=2)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def get(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('custom_admin:manage_users'), params)
+        self.assertEqual(response.status_code, 200)
+        user_queries = [q['sql'] for q in ctx.captured_queries if 'LIMIT 51' in q['sql']]
+        self.assertEqual(len(user_queries), 1)
+        return response, user_queries[0]
+
+    def test_keyset_pages(self):
+        response, _ = self.get()
+        page = response.context['page_obj']
+        self.assertEqual([u.username for u in page][:2], ['admin', 'user000'])
+        self.assertTrue(page.has_next)
+
+        response, sql = self.get(cursor=page.next_cursor)
+        self.assertEqual(response.context['users'][0].username, 'user049')
+        self.assertNotIn('password', sql)
+
+    def test_prefix_search_is_indexed(self):
+        response, sql = self.get(q='USER00')
+        self.assertEqual(len(response.context['users']), 10)
+        response, sql = self.get(q='person11')
+        self.assertEqual([u.username for u in response.context['users']], ['user{}'.format(i) for i in range(110, 120)])
+
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('custom_admin_username_lower_idx', plan)
+        self.assertIn('custom_admin_email_lower_idx', plan)
+
+    def test_order_and_cart_counts(self):
+        response, _ = self.get(q='user007')
+        shopper, = response.context['users']
+        self.assertEqual((shopper.order_count, shopper.cart_count), (3, 1))
+
+
+class ProductListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        cls.rings = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=False)
+        cls.bags = Category.objects.create(title='Bags', slug='bags', is_active=True, is_featured=False)
+        cls.products = [
+            Product.objects.create(
+                title='Ring {}'.format(i), slug='ring-{}'.format(i), sku='R{}'.format(i), short_description='Gold',
+                price='10.00', category=cls.rings if i < 60 else cls.bags, is_active=True, is_featured=False,
+            )
+            for i in range(70)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+        self.url = reverse('custom_admin:product-list')
+
+    def bulk(self, data, query=''):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('{}?{}'.format(self.url, query), data)
+        self.assertEqual(response.status_code, 302)
+        return [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "store_product"')]
+
+    def test_staff_only(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_paginated_with_categories_joined(self):
+        with CaptureQueriesContext(connection) as full_page:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['products']), 50)
+
+        with CaptureQueriesContext(connection) as small_page:
+            response = self.client.get(self.url, {'category': self.bags.id})
+        self.assertEqual(response.context['paginator'].count, 10)
+        # Categories come with the products, so rows add no queries
+        self.assertEqual(len(full_page.captured_queries), len(small_page.captured_queries))
+
+    def test_price_change_on_selection(self):
+        ids = [self.products[0].id, self.products[1].id]
+        updates = self.bulk({'action': 'price', 'percent': '12.5', 'target': 'selected', 'ids': ids})
+        self.assertEqual(len(updates), 1)
+        prices = set(Product.objects.filter(id__in=ids).values_list('price', flat=True))
+        self.assertEqual(prices, {Decimal('11.25')})
+        self.assertEqual(Product.objects.exclude(id__in=ids).filter(price=10).count(), 68)
+
+    def test_flags_and_move_on_filter(self):
+        before = Product.objects.get(id=self.products[65].id).updated_at
+        updates = self.bulk({'action': 'deactivate', 'target': 'filtered'}, 'category={}'.format(self.bags.id))
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Product.objects.filter(is_active=False).count(), 10)
+        self.assertGreater(Product.objects.get(id=self.products[65].id).updated_at, before)
+
+        updates = self.bulk({'action': 'move', 'category': self.rings.id, 'target': 'filtered'}, 'is_active=0')
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Product.objects.filter(category=self.rings).count(), 70)
+
+    def test_invalid_action_changes_nothing(self):
+        self.assertEqual(self.bulk({'action': 'price', 'target': 'selected', 'ids': [self.products[0].id]}), [])
+        self.assertEqual(self.bulk({'action': 'feature', 'target': 'selected'}), [])
+
+
+class OrderExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        shopper = User.objects.create_user('shopper', email='shopper@example.com')
+        category = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=False)
+        product = Product.objects.create(
+            title='Ring, gold', slug='ring', sku='R1', short_description='Gold', price=Decimal('12.50'),
+            category=category, is_active=True, is_featured=False,
+        )
+        address = Address.objects.create(user=shopper, locality='Market', city='Kampala', state='Central')
+        for status in ('Pending', 'Delivered', 'Delivered', 'Cancelled'):
+            Order.objects.create(user=shopper, address=address, product=product, quantity=2, status=status)
+        # Placed last week, outside a date range of today
+        Order.objects.filter(status='Cancelled').update(ordered_date=timezone.now() - timedelta(days=7))
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+        self.url = reverse('custom_admin:export-orders')
+
+    def download(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, params)
+            self.assertTrue(response.streaming)
+            body = b''.join(response.streaming_content).decode()
+        order_queries = [q['sql'] for q in ctx.captured_queries if 'FROM "store_order"' in q['sql']]
+        # One query joining user, address and product
+        self.assertEqual(len(order_queries), 1)
+        self.assertIn('INNER JOIN "store_address"', order_queries[0])
+        return response, body
+
+    def test_staff_only(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url, {'format': 'csv'}).status_code, 302)
+
+    def test_form_without_params(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.streaming)
+
+    def test_csv_filtered_by_status(self):
+        response, body = self.download(format='csv', status=['Delivered', 'Cancelled'])
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual([row['status'] for row in rows], ['Delivered', 'Delivered', 'Cancelled'])
+        self.assertEqual(rows[0]['product'], 'Ring, gold')
+        self.assertEqual((rows[0]['email'], rows[0]['city'], rows[0]['unit_price']), ('shopper@example.com', 'Kampala', '12.50'))
+
+    def test_jsonl_filtered_by_date(self):
+        today = timezone.localdate().isoformat()
+        _, body = self.download(format='jsonl', since=today, until=today)
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertNotIn('Cancelled', {row['status'] for row in rows})
+
+    def test_command_matches_view(self):
+        out = StringIO()
+        call_command('export_orders', '--status', 'Pending', '--format', 'jsonl', stdout=out, stderr=StringIO())
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([(row['username'], row['sku'], row['quantity']) for row in rows], [('shopper', 'R1', 2)])
+
+
+class PerformancePageTests(TestCase):
+    def setUp(self):
+        self.url = reverse('custom_admin:performance')
+        profiling.stats.reset()
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get(self.url).status_code, 302)
 
-# Create your tests here.
+    def test_report_and_reset(self):
+        self.client.force_login(User.objects.create_user('staff', password='secret', is_staff=True))
+        self.client.get(reverse('custom_admin:manage_users'))
+        response = self.client.get(self.url)
+        self.assertContains(response, 'custom_admin:manage_users')
+        self.assertRedirects(self.client.post(self.url), self.url)
+        self.assertEqual([row['view'] for row in profiling.stats.report()], ['custom_admin:performance'])
@@ -10,6 +10,8 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     # Add more URLs for user management, system settings, etc.
     path('manage_users/', manage_users, name='manage_users'),
+    path('orders/export/', views.export_orders, name='export-orders'),
+    path('performance/', views.performance, name='performance'),
     path('products/', ProductListView.as_view(), name='product-list'),
     path('products/add/', ProductCreateView.as_view(), name='product-add'),
     path('products/<int:pk>/edit/', ProductUpdateView.as_view(), name='product-edit'),
@@ -3,12 +3,22 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required,user_passes_test
 from django.contrib.auth import get_user_model
 from django.contrib import messages
-from store.models import Product
+from store.models import Cart, DailySales, HourlySales, Order, Product
+from store.pagination import KeysetPaginator
+from store import bulk, order_io, profiling
+from .forms import OrderExportForm, ProductBulkActionForm, ProductFilterForm
 from django.views.generic import ListView
 from django.contrib.auth import update_session_auth_hash
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Lower
+from django.utils import timezone
+from datetime import timedelta
 
 from django.contrib.auth.forms import UserChangeForm, PasswordChangeForm
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.utils.decorators import method_decorator
 from django.views.generic.edit import UpdateView
 from django.views.generic.edit import DeleteView
 from django.views.generic.edit import CreateView
@@ -17,23 +27,147 @@ def is_admin(user):
     return user.is_authenticated and user.is_staff  # Modify this logic based on your user roles
 
 
+# Days shown by the dashboard charts
+SALES_DAYS = 30
+PIE_COLORS = ['#46BFBD', '#FDB45C', '#949FB1', '#4D5360', '#F7464A', '#009688']
+
+
 @user_passes_test(is_admin, login_url='store:login')
 def dashboard(request):
     user_count = User.objects.count()
-    
+
+    # Charts read the sales rollups only, never the orders themselves
+    today = timezone.localdate()
+    days = [today - timedelta(days=n) for n in range(SALES_DAYS - 1, -1, -1)]
+    daily = DailySales.objects.filter(period__gte=days[0])
+    sold = daily.exclude(status='Cancelled')
+    per_day = {
+        row['period']: row
+        for row in sold.values('period').annotate(order_count=Sum('orders'), revenue_total=Sum('revenue')).order_by()
+    }
+    totals = sold.aggregate(order_count=Sum('orders'), unit_count=Sum('units'), revenue_total=Sum('revenue'))
+    by_status = daily.values('status').annotate(order_count=Sum('orders')).order_by('-order_count')
+    by_category = (
+        sold.values('category__title').annotate(revenue_total=Sum('revenue')).order_by('-revenue_total')[:8]
+    )
+
+    this_hour = timezone.localtime().replace(minute=0, second=0, microsecond=0)
+    hours = [this_hour - timedelta(hours=n) for n in range(23, -1, -1)]
+    per_hour = dict(
+        HourlySales.objects.filter(period__gte=hours[0]).exclude(status='Cancelled')
+        .values('period').annotate(order_count=Sum('orders')).order_by().values_list('period', 'order_count')
+    )
+
+    charts = {
+        'daily': {
+            'labels': [day.strftime('%d %b') for day in days],
+            'revenue': [float(per_day[day]['revenue_total']) if day in per_day else 0 for day in days],
+            'orders': [per_day[day]['order_count'] if day in per_day else 0 for day in days],
+        },
+        'hourly': {
+            'labels': [timezone.localtime(hour).strftime('%H:00') for hour in hours],
+            'orders': [per_hour.get(hour, 0) for hour in hours],
+        },
+        'status': [
+            {'label': row['status'], 'value': row['order_count'], 'color': PIE_COLORS[i % len(PIE_COLORS)]}
+            for i, row in enumerate(by_status) if row['order_count']
+        ],
+        'category': {
+            'labels': [row['category__title'] for row in by_category],
+            'revenue': [float(row['revenue_total']) for row in by_category],
+        },
+    }
 
     context = {
         'user_count': user_count,
-        # Include other data needed for charts
+        'sales_days': SALES_DAYS,
+        'order_count': totals['order_count'] or 0,
+        'unit_count': totals['unit_count'] or 0,
+        'revenue_total': totals['revenue_total'] or 0,
+        'charts': charts,
     }
 
     return render(request, 'custom_admin/dashboard.html', context)
 
 
+@user_passes_test(is_admin, login_url='store:login')
+def export_orders(request):
+    """Download the orders matching the form as CSV or JSON Lines, streamed as they are read."""
+    form = OrderExportForm(request.GET or None)
+    if not form.is_valid():
+        return render(request, 'custom_admin/export_orders.html', {'form': form})
+
+    data = form.cleaned_data
+    orders = order_io.filter_orders(statuses=data['status'], since=data['since'], until=data['until'])
+    fmt = data['format']
+    response = StreamingHttpResponse(
+        order_io.encode_rows(order_io.export_rows(orders), fmt), content_type=order_io.CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = 'attachment; filename="orders-{:%Y%m%d-%H%M}.{}"'.format(timezone.localtime(), fmt)
+    return response
+
+
+@user_passes_test(is_admin, login_url='store:login')
+def performance(request):
+    """Latency percentiles and repeated queries per view, as recorded by store.profiling."""
+    if request.method == 'POST':
+        profiling.stats.reset()
+        messages.success(request, 'Profiling statistics cleared.')
+        return redirect('custom_admin:performance')
+    context = {
+        'views': profiling.stats.report(),
+        'since': profiling.stats.started,
+        'enabled': 'store.profiling.ProfilingMiddleware' in settings.MIDDLEWARE
+                   and getattr(settings, 'PROFILING_ENABLED', True),
+    }
+    return render(request, 'custom_admin/performance.html', context)
+
+
+USERS_PER_PAGE = 50
+USER_SORT_KEYS = {'username': ('username', False)}
+
+
+def count_subquery(model):
+    # Correlated COUNT per user, answered from the (user, ...) index of the model
+    rows = model.objects.filter(user=OuterRef('pk')).order_by().values('user').annotate(n=Count('*')).values('n')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def search_users(queryset, query):
+    """Case-insensitive prefix match on username or email.
+
+    Written as ranges over lower(username) and lower(email) so SQLite can
+    answer both from the expression indexes of custom_admin's migration 0002.
+    LIKE would scan the table, because it is case-insensitive while the
+    regular username index is not.
+    """
+    prefix = query.lower()
+    upper = prefix + '\uffff'
+    return queryset.alias(username_lower=Lower('username'), email_lower=Lower('email')).filter(
+        Q(username_lower__gte=prefix, username_lower__lt=upper) | Q(email_lower__gte=prefix, email_lower__lt=upper)
+    )
+
+
 @user_passes_test(lambda u: u.is_superuser)  # Restrict access to admin users only
 def manage_users(request):
-    users = User.objects.all()
-    return render(request, 'custom_admin/manage_users.html', {'users': users})
+    query = request.GET.get('q', '').strip()
+    users = User.objects.only('id', 'username', 'email')
+    count_cache_key = 'custom_admin:user_count'
+    if query:
+        users = search_users(users, query)
+        count_cache_key = None
+    users = users.annotate(order_count=count_subquery(Order), cart_count=count_subquery(Cart))
+
+    paginator = KeysetPaginator(
+        users, 'username', per_page=USERS_PER_PAGE, count_cache_key=count_cache_key, sort_keys=USER_SORT_KEYS,
+    )
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    context = {
+        'users': page_obj.object_list,
+        'page_obj': page_obj,
+        'query': query,
+    }
+    return render(request, 'custom_admin/manage_users.html', context)
 
 @user_passes_test(lambda u: u.is_superuser)  # Restrict access to admin users only
 def edit_user(request, user_id):
@@ -75,10 +209,58 @@ def change_password(request, user_id):
 
     return render(request, 'custom_admin/change_password.html', {'form': form, 'user': user})
 
+@method_decorator(user_passes_test(is_admin, login_url='store:login'), name='dispatch')
 class ProductListView(ListView):
     model = Product
     template_name = 'custom_admin/product_list.html'
     context_object_name = 'products'
+    paginate_by = 50
+
+    def get_filter_form(self):
+        return ProductFilterForm(self.request.GET or None)
+
+    def get_queryset(self):
+        return self.get_filter_form().filter(Product.objects.select_related('category'))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.copy()
+        query.pop('page', None)
+        context.update({
+            'filter_form': self.get_filter_form(),
+            'bulk_form': ProductBulkActionForm(),
+            'filter_query': query.urlencode(),
+        })
+        return context
+
+    def post(self, request, *args, **kwargs):
+        """Apply a bulk action to the ticked products, or to everything the current filter matches."""
+        form = ProductBulkActionForm(request.POST)
+        # Back to the first page of the same filter, the action may have shrunk it
+        query = request.GET.copy()
+        query.pop('page', None)
+        redirect_url = '{}?{}'.format(reverse('custom_admin:product-list'), query.urlencode())
+        if not form.is_valid():
+            for error in form.errors.values():
+                messages.error(request, ' '.join(error))
+            return redirect(redirect_url)
+
+        data = form.cleaned_data
+        if data['target'] == 'selected':
+            products = Product.objects.filter(id__in=form.selected_ids)
+        else:
+            products = self.get_filter_form().filter(Product.objects.all())
+
+        action = data['action']
+        if action == 'price':
+            count = bulk.change_price(products, data['percent'])
+        elif action == 'move':
+            count = bulk.move_to_category(products, data['category'])
+        else:
+            flag = 'is_featured' if action in ('feature', 'unfeature') else 'is_active'
+            count = bulk.set_flags(products, **{flag: action in ('activate', 'feature')})
+        messages.success(request, '{}: {} products updated.'.format(dict(form.ACTIONS)[action], count))
+        return redirect(redirect_url)
 
 class ProductCreateView(CreateView):
     model = Product
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Address, Subscription, Category, Product, Cart, Order, ProductReview, ContactMessage, BlogPost
+from .sku import next_sku
 # Register your models here.
 class AddressAdmin(admin.ModelAdmin):
     list_display = ('user', 'locality', 'city', 'state')
@@ -32,11 +33,7 @@ class ProductAdmin(admin.ModelAdmin):
 
     def save_model(self, request, obj, form, change):
         if not obj.sku:  # Only generate SKU if it's not already set (i.e., it's a new product)
-            last_product = Product.objects.order_by('-sku').first()
-            if last_product:
-                obj.sku = str(int(last_product.sku) + 1)
-            else:
-                obj.sku = '1'
+            obj.sku = next_sku()
         super().save_model(request, obj, form, change)
         
 class CartAdmin(admin.ModelAdmin):
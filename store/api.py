@@ -0,0 +1,206 @@
+"""Read-only JSON catalog for the mobile client and storefront widgets.
+
+``fields=title,price`` picks the keys of every result and limits the
+columns loaded with ``.only()``; ``ids=1,2,3`` fetches several records in
+one query. ETags hash the ids and ``updated_at`` of the returned rows, so
+a client polling with If-None-Match gets a 304 without the payload.
+"""
+import hashlib
+
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
+
+from .models import Category, Product
+from .pagination import MAX_DB_INT, SORT_KEYS, KeysetPaginator
+
+
+MAX_IDS = 100
+DEFAULT_LIMIT = 24
+MAX_LIMIT = 100
+
+
+def _file_url(field_file):
+    return field_file.url if field_file else None
+
+
+# API field -> (model field loaded with .only(), value of an instance)
+PRODUCT_FIELDS = {
+    'id': ('id', lambda p: p.id),
+    'title': ('title', lambda p: p.title),
+    'slug': ('slug', lambda p: p.slug),
+    'sku': ('sku', lambda p: p.sku),
+    'short_description': ('short_description', lambda p: p.short_description),
+    'detail_description': ('detail_description', lambda p: p.detail_description),
+    'price': ('price', lambda p: p.price),
+    'category': ('category', lambda p: p.category_id),
+    'image': ('product_image', lambda p: _file_url(p.product_image)),
+    'is_featured': ('is_featured', lambda p: p.is_featured),
+    'updated_at': ('updated_at', lambda p: p.updated_at),
+}
+PRODUCT_DEFAULT_FIELDS = ('id', 'title', 'slug', 'price', 'category', 'image', 'updated_at')
+
+CATEGORY_FIELDS = {
+    'id': ('id', lambda c: c.id),
+    'title': ('title', lambda c: c.title),
+    'slug': ('slug', lambda c: c.slug),
+    'description': ('description', lambda c: c.description),
+    'image': ('category_image', lambda c: _file_url(c.category_image)),
+    'is_featured': ('is_featured', lambda c: c.is_featured),
+    'updated_at': ('updated_at', lambda c: c.updated_at),
+}
+CATEGORY_DEFAULT_FIELDS = ('id', 'title', 'slug', 'image', 'updated_at')
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def parse_fields(request, available, default):
+    value = request.GET.get('fields')
+    if not value:
+        return default
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown or not fields:
+        raise BadRequest('Unknown fields: {}. Available: {}.'.format(', '.join(unknown), ', '.join(available)))
+    return fields
+
+
+def parse_ids(request):
+    value = request.GET.get('ids')
+    if value is None:
+        return None
+    try:
+        ids = list(dict.fromkeys(int(pk) for pk in value.split(',') if pk.strip()))
+    except ValueError:
+        raise BadRequest('ids must be a comma separated list of integers.')
+    # SQLite can't bind larger integers, and no row has a smaller id
+    if any(not 0 < pk <= MAX_DB_INT for pk in ids):
+        raise BadRequest('ids must be between 1 and {}.'.format(MAX_DB_INT))
+    if not ids or len(ids) > MAX_IDS:
+        raise BadRequest('ids takes between 1 and {} values.'.format(MAX_IDS))
+    return ids
+
+
+def parse_limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequest('limit must be an integer.')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def only(queryset, spec, fields, *extra):
+    # updated_at is always loaded, the ETag is derived from it
+    columns = {spec[name][0] for name in fields} | {'id', 'updated_at'} | set(extra)
+    return queryset.only(*columns)
+
+
+def serialize(objects, spec, fields):
+    return [{name: spec[name][1](obj) for name in fields} for obj in objects]
+
+
+def make_etag(resource, fields, objects, *extra):
+    digest = hashlib.md5('{}:{}'.format(resource, ','.join(fields)).encode())
+    for obj in objects:
+        digest.update('|{}:{}'.format(obj.id, obj.updated_at.isoformat()).encode())
+    for value in extra:
+        digest.update('|{}'.format(value).encode())
+    return quote_etag(digest.hexdigest())
+
+
+def api_response(request, payload, etag, status=200):
+    # Cheap revalidation replaces caching: clients always ask, mostly get a 304
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(payload, status=status, json_dumps_params={'separators': (',', ':')})
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def error_response(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def by_ids(queryset, ids):
+    """One ``id IN (...)`` query, results in the requested order, unknown ids left out."""
+    found = {obj.id: obj for obj in queryset.filter(id__in=ids).order_by()}
+    return [found[pk] for pk in ids if pk in found]
+
+
+@require_safe
+def product_list(request):
+    try:
+        fields = parse_fields(request, PRODUCT_FIELDS, PRODUCT_DEFAULT_FIELDS)
+        ids = parse_ids(request)
+        limit = parse_limit(request)
+    except BadRequest as e:
+        return error_response(str(e))
+
+    products = Product.objects.filter(is_active=True)
+    if ids is not None:
+        objects = by_ids(only(products, PRODUCT_FIELDS, fields), ids)
+        return api_response(request, {'results': serialize(objects, PRODUCT_FIELDS, fields)},
+                            make_etag('products', fields, objects))
+
+    sort = request.GET.get('sort', 'default')
+    if sort not in SORT_KEYS:
+        return error_response('sort must be one of: {}.'.format(', '.join(SORT_KEYS)))
+    category = request.GET.get('category')
+    if category:
+        products = products.filter(category__slug=category)
+
+    # The sort column is loaded as well, the cursors are built from it
+    queryset = only(products, PRODUCT_FIELDS, fields, SORT_KEYS[sort][0])
+    page = KeysetPaginator(queryset, sort, per_page=limit).get_page(request.GET.get('cursor'))
+    payload = {
+        'results': serialize(page, PRODUCT_FIELDS, fields),
+        'next': page.next_cursor if page.has_next else None,
+        'previous': page.previous_cursor if page.has_previous else None,
+    }
+    return api_response(request, payload, make_etag('products', fields, page, payload['next'], payload['previous']))
+
+
+@require_safe
+def product_detail(request, pk):
+    try:
+        fields = parse_fields(request, PRODUCT_FIELDS, PRODUCT_DEFAULT_FIELDS)
+    except BadRequest as e:
+        return error_response(str(e))
+    if pk > MAX_DB_INT:
+        return error_response('Product not found.', status=404)
+    product = only(Product.objects.filter(is_active=True), PRODUCT_FIELDS, fields).filter(id=pk).first()
+    if product is None:
+        return error_response('Product not found.', status=404)
+    return api_response(request, serialize([product], PRODUCT_FIELDS, fields)[0], make_etag('product', fields, [product]))
+
+
+@require_safe
+def category_list(request):
+    try:
+        fields = parse_fields(request, CATEGORY_FIELDS, CATEGORY_DEFAULT_FIELDS)
+        ids = parse_ids(request)
+    except BadRequest as e:
+        return error_response(str(e))
+
+    categories = only(Category.objects.filter(is_active=True), CATEGORY_FIELDS, fields)
+    objects = by_ids(categories, ids) if ids is not None else list(categories)
+    return api_response(request, {'results': serialize(objects, CATEGORY_FIELDS, fields)},
+                        make_etag('categories', fields, objects))
+
+
+@require_safe
+def category_detail(request, pk):
+    try:
+        fields = parse_fields(request, CATEGORY_FIELDS, CATEGORY_DEFAULT_FIELDS)
+    except BadRequest as e:
+        return error_response(str(e))
+    if pk > MAX_DB_INT:
+        return error_response('Category not found.', status=404)
+    category = only(Category.objects.filter(is_active=True), CATEGORY_FIELDS, fields).filter(id=pk).first()
+    if category is None:
+        return error_response('Category not found.', status=404)
+    return api_response(request, serialize([category], CATEGORY_FIELDS, fields)[0], make_etag('category', fields, [category]))
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+
+        from . import profiling, signals  # noqa: F401
+
+        if getattr(settings, 'PROFILING_ENABLED', True):
+            # Every connection, including those of the async views' thread pool,
+            # reports its queries to the request being profiled
+            connection_created.connect(profiling.install, dispatch_uid='store.profiling')
@@ -0,0 +1,27 @@
+from django.db.backends.sqlite3 import base
+
+from store.db import get_sqlite_pragmas, pragma_statements
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite backend tuned for concurrent web traffic.
+
+    Each new connection gets the PRAGMAs of store.db, and transactions
+    start with BEGIN IMMEDIATE. A deferred BEGIN that reads first and
+    writes later cannot wait for the write lock: SQLite fails it at once
+    with "database is locked" (busy_timeout does not apply). Taking the
+    lock up front makes the writer queue on busy_timeout instead.
+
+    atomic() can't tell whether its block will write, so read-only blocks
+    take the lock too and wait behind other writers. Every atomic block
+    in this project writes, so keep pure reads out of atomic().
+    """
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for statement in pragma_statements(get_sqlite_pragmas()):
+            conn.execute(statement)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
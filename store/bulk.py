@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, F, Func, Value
+from django.utils import timezone
+
+from .caching import invalidate_cart_badges, invalidate_pages
+from .related import RELATED_INDEX_KEY
+from .sales import move_sales, product_sales
+
+
+def _update(queryset, **values):
+    """One UPDATE over the matching products, followed by the invalidation their signals would do.
+
+    QuerySet.update() sends no signals and leaves auto_now alone, so
+    updated_at is set explicitly (API ETags are derived from it) and the
+    page cache and related products of the touched categories are reset,
+    as are the cart badges holding repriced products. Sales rollups of moved
+    products follow them to the new category. The FTS index follows
+    through its database triggers.
+    """
+    category_ids = set(queryset.order_by().values_list('category_id', flat=True).distinct())
+    # Read before the UPDATE, which may change which products the queryset matches
+    repriced = list(queryset.order_by().values_list('id', flat=True)) if 'price' in values else []
+    with transaction.atomic():
+        sales = product_sales(queryset.order_by().values('id')) if 'category' in values else []
+        updated = queryset.order_by().update(updated_at=timezone.now(), **values)
+        if sales:
+            move_sales(sales, values['category'].id)
+    if repriced:
+        invalidate_cart_badges(repriced)
+    if 'category' in values:
+        category_ids.add(values['category'].id)
+    invalidate_pages('catalog')
+    cache.delete_many(
+        [RELATED_INDEX_KEY.format(category_id=category_id) for category_id in category_ids]
+        + ['store:category_count:{}'.format(category_id) for category_id in category_ids]
+    )
+    return updated
+
+
+def set_flags(queryset, **flags):
+    """Set is_active and/or is_featured on every product of the queryset."""
+    return _update(queryset, **flags)
+
+
+def change_price(queryset, percent):
+    """Raise (or with a negative percent, lower) prices by a percentage, rounded to cents in SQL."""
+    factor = 1 + Decimal(percent) / 100
+    price = Func(F('price') * factor, Value(2), function='ROUND', output_field=DecimalField())
+    return _update(queryset, price=price)
+
+
+def move_to_category(queryset, category):
+    return _update(queryset, category=category)
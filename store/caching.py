@@ -0,0 +1,152 @@
+import hashlib
+import re
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_vary_headers
+
+from .cart import get_cart_totals
+from .models import Cart, Category
+
+
+CATEGORY_MENU_VERSION_KEY = 'store:category_menu:version'
+CART_BADGE_KEY = 'store:cart_badge:{user_id}'
+PAGE_VERSION_KEY = 'store:page:{scope}:version'
+PAGE_KEY = 'store:page:{scope}:v{version}:{digest}'
+PRODUCT_CARD_KEY = 'store:product_card:{id}:{stamp}'
+
+# Entries are invalidated explicitly, the timeout only bounds stale leftovers
+MENU_TIMEOUT = 60 * 60 * 24
+CART_BADGE_TIMEOUT = 60 * 60
+# Invalidation only reaches the cache of the process that handled the write
+# while that cache is process-local; see CACHE_STALE_TIMEOUT in settings
+DEFAULT_STALE_TIMEOUT = 60
+# Popularity sorting is not invalidated, so cached pages may lag by this much
+# (capped by CACHE_STALE_TIMEOUT like the other invalidated entries)
+PAGE_TIMEOUT = 60 * 5
+# Card keys change with the product, so entries only need to age out
+PRODUCT_CARD_TIMEOUT = 60 * 60 * 24
+
+CSRF_INPUT_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_PLACEHOLDER = '__store_csrf_token__'
+
+
+def stale_timeout(timeout):
+    """``timeout`` capped by CACHE_STALE_TIMEOUT, for entries that writes invalidate."""
+    limit = getattr(settings, 'CACHE_STALE_TIMEOUT', DEFAULT_STALE_TIMEOUT)
+    return timeout if limit is None else min(timeout, limit)
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The version key was evicted, any fresh value retires the old entries
+        cache.add(key, 1, timeout=None)
+        return cache.incr(key)
+
+
+def get_category_menu():
+    """Active categories for the navbar, rebuilt only after a Category changes."""
+    key = 'store:category_menu:v{}'.format(get_version(CATEGORY_MENU_VERSION_KEY))
+    menu = cache.get(key)
+    if menu is None:
+        menu = list(Category.objects.filter(is_active=True).values('id', 'title', 'slug'))
+        cache.set(key, menu, stale_timeout(MENU_TIMEOUT))
+    return menu
+
+
+def invalidate_category_menu():
+    bump_version(CATEGORY_MENU_VERSION_KEY)
+
+
+def get_cart_badge(user_id):
+    """Line count and subtotal shown next to the Cart link of the navbar."""
+    key = CART_BADGE_KEY.format(user_id=user_id)
+    badge = cache.get(key)
+    if badge is None:
+        totals = get_cart_totals(user_id)
+        badge = {'count': totals.line_count, 'total': totals.subtotal}
+        cache.set(key, badge, stale_timeout(CART_BADGE_TIMEOUT))
+    return badge
+
+
+def invalidate_cart_badge(user_id):
+    cache.delete(CART_BADGE_KEY.format(user_id=user_id))
+
+
+def invalidate_cart_badges(products):
+    """Clear the badge of every cart holding one of ``products`` (ids or a queryset), after a price change."""
+    user_ids = Cart.objects.filter(product__in=products).order_by().values_list('user_id', flat=True).distinct()
+    cache.delete_many([CART_BADGE_KEY.format(user_id=user_id) for user_id in user_ids])
+
+
+def invalidate_pages(scope):
+    bump_version(PAGE_VERSION_KEY.format(scope=scope))
+
+
+def _page_key(request, scope):
+    version = get_version(PAGE_VERSION_KEY.format(scope=scope))
+    # Sort the query string so ?sort=a&cursor=b and ?cursor=b&sort=a share an entry
+    query = sorted(request.GET.lists())
+    digest = hashlib.md5('{}?{}'.format(request.path, query).encode()).hexdigest()
+    return PAGE_KEY.format(scope=scope, version=version, digest=digest)
+
+
+def _cached_page(request, scope):
+    """Return ``(key, response)``; the key is None when the request must not be cached."""
+    if request.method != 'GET' or request.user.is_authenticated or len(get_messages(request)):
+        return None, None
+
+    key = _page_key(request, scope)
+    cached = cache.get(key)
+    if cached is None:
+        return key, None
+    content, content_type = cached
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+    return key, HttpResponse(content, content_type=content_type)
+
+
+def _store_page(key, response, timeout):
+    if response.status_code == 200 and not response.streaming and not response.cookies:
+        content = CSRF_INPUT_RE.sub(r'\g<1>{}\g<2>'.format(CSRF_PLACEHOLDER), response.content.decode(response.charset))
+        cache.set(key, (content, response['Content-Type']), stale_timeout(timeout))
+
+
+def cache_anonymous_page(scope, timeout=PAGE_TIMEOUT, on_hit=None):
+    """Serve anonymous GETs of a view from the cache, keyed on URL, query and the scope's version.
+
+    Signed-in shoppers and requests with pending messages always render.
+    CSRF tokens are swapped for a placeholder before storing and replaced
+    with a token of the current visitor on every hit. ``on_hit`` is called
+    with the view's arguments when the cache answers instead of the view.
+    Every response varies on Cookie, since signing in changes the page.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            key, response = _cached_page(request, scope)
+            if response is not None:
+                if on_hit is not None:
+                    on_hit(request, *args, **kwargs)
+            else:
+                response = view(request, *args, **kwargs)
+                if key is not None:
+                    _store_page(key, response, timeout)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapped
+    return decorator
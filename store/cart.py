@@ -0,0 +1,66 @@
+import decimal
+from dataclasses import dataclass, field
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+
+from .models import Cart
+
+
+# Flat shipping charge added to every cart
+SHIPPING_AMOUNT = decimal.Decimal(10)
+
+# SQLite hands computed decimals back unscaled, so money is rounded to cents here
+CENTS = decimal.Decimal('0.01')
+
+LINE_TOTAL = ExpressionWrapper(
+    F('quantity') * F('product__price'),
+    output_field=DecimalField(max_digits=12, decimal_places=2),
+)
+
+
+@dataclass
+class CartSummary:
+    lines: list = field(default_factory=list)
+    subtotal: decimal.Decimal = decimal.Decimal(0)
+    item_count: int = 0
+    line_count: int = 0
+    shipping_amount: decimal.Decimal = SHIPPING_AMOUNT
+
+    @property
+    def total_amount(self):
+        return self.subtotal + self.shipping_amount
+
+    def __bool__(self):
+        return bool(self.lines)
+
+
+def cart_lines(user):
+    """Cart rows of one user with the product joined and the line total computed by the database."""
+    return (
+        Cart.objects.filter(user=user)
+        .select_related('product')
+        .annotate(line_total=LINE_TOTAL)
+        .order_by('created_at', 'id')
+    )
+
+
+def get_cart_summary(user):
+    """Lines, subtotal, item count and shipping of a user's cart in a single query."""
+    lines = list(cart_lines(user))
+    for line in lines:
+        line.line_total = line.line_total.quantize(CENTS)
+    subtotal = sum((line.line_total for line in lines), decimal.Decimal(0))
+    item_count = sum(line.quantity for line in lines)
+    return CartSummary(lines=lines, subtotal=subtotal, item_count=item_count, line_count=len(lines))
+
+
+def get_cart_totals(user):
+    """Subtotal and item count of a user's cart as one aggregate, without loading the lines."""
+    totals = Cart.objects.filter(user=user).aggregate(
+        subtotal=Sum(LINE_TOTAL), item_count=Sum('quantity'), line_count=Count('id'),
+    )
+    return CartSummary(
+        subtotal=(totals['subtotal'] or decimal.Decimal(0)).quantize(CENTS),
+        item_count=totals['item_count'] or 0,
+        line_count=totals['line_count'],
+    )
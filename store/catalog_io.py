@@ -0,0 +1,225 @@
+"""Streaming CSV/JSON Lines import and export of the product catalog.
+
+Both formats share PRODUCT_COLUMNS, so an export can be edited and
+imported back. Products are matched on SKU; rows without one are created
+and get a SKU from the hi/lo allocator.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .caching import invalidate_cart_badges, invalidate_pages
+from .models import Category, Product
+from .related import RELATED_INDEX_KEY
+from .sku import advance_past, assign_skus
+
+
+PRODUCT_COLUMNS = (
+    'sku', 'title', 'slug', 'category', 'price', 'short_description', 'detail_description',
+    'is_active', 'is_featured',
+)
+# Product fields written by an import, category is category_id
+IMPORT_FIELDS = ['title', 'slug', 'category', 'price', 'short_description', 'detail_description', 'is_active', 'is_featured']
+
+FORMATS = ('csv', 'jsonl')
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f', ''}
+
+
+class RowError(ValueError):
+    pass
+
+
+def guess_format(path, default='csv'):
+    for fmt in FORMATS:
+        if path.endswith('.' + fmt) or (fmt == 'jsonl' and path.endswith('.json')):
+            return fmt
+    return default
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, dict) pairs without loading the whole file."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield number, RowError('invalid JSON: {}'.format(e))
+                continue
+            yield number, row if isinstance(row, dict) else RowError('expected a JSON object')
+
+
+def parse_bool(value, column):
+    if isinstance(value, bool):
+        return value
+    text = str(value if value is not None else '').strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise RowError('{} must be true or false, got {!r}'.format(column, value))
+
+
+def parse_row(row, categories):
+    """Validate one input row and return the Product it describes (unsaved, id unset)."""
+    def text(column):
+        value = row.get(column)
+        return '' if value is None else str(value).strip()
+
+    title = text('title')
+    if not title:
+        raise RowError('title is required')
+    # SQLite doesn't enforce max_length, other databases would fail the whole batch
+    for column in ('title', 'slug', 'sku'):
+        max_length = Product._meta.get_field(column).max_length
+        if len(text(column)) > max_length:
+            raise RowError('{} is too long (at most {} characters)'.format(column, max_length))
+    short_description = text('short_description')
+    if not short_description:
+        raise RowError('short_description is required')
+    if text('category') not in categories:
+        raise RowError('unknown category {!r}'.format(text('category')))
+    category_id = categories[text('category')]
+    if category_id is None:
+        raise RowError('category {!r} is ambiguous, several categories use that slug'.format(text('category')))
+    try:
+        price = Decimal(text('price'))
+    except InvalidOperation:
+        raise RowError('price must be a number, got {!r}'.format(row.get('price')))
+    if not price.is_finite() or price < 0 or price >= 10 ** 8:
+        raise RowError('price out of range: {}'.format(price))
+
+    return Product(
+        sku=text('sku') or None,
+        title=title,
+        slug=text('slug'),
+        category_id=category_id,
+        price=price.quantize(Decimal('0.01')),
+        short_description=short_description,
+        detail_description=text('detail_description') or None,
+        is_active=parse_bool(row.get('is_active', True), 'is_active'),
+        is_featured=parse_bool(row.get('is_featured', False), 'is_featured'),
+    )
+
+
+class ImportStats:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.category_ids = set()
+
+    @property
+    def rows(self):
+        return self.created + self.updated + len(self.errors)
+
+
+def _write_batch(products, stats, dry_run):
+    # The last row of a SKU wins within a batch
+    by_sku = {}
+    new = []
+    for product in products:
+        if product.sku:
+            by_sku[product.sku] = product
+        else:
+            new.append(product)
+
+    existing = {
+        sku: (pk, slug, category_id, price) for sku, pk, slug, category_id, price
+        in Product.objects.filter(sku__in=list(by_sku)).values_list('sku', 'id', 'slug', 'category_id', 'price')
+    }
+    updates = []
+    repriced = []
+    for sku, product in by_sku.items():
+        if sku in existing:
+            # Without a slug column an update keeps the product's URL
+            product.id, current_slug, old_category_id, old_price = existing[sku]
+            product.slug = product.slug or current_slug
+            stats.category_ids.add(old_category_id)
+            updates.append(product)
+            if product.price != old_price:
+                repriced.append(product.id)
+        else:
+            new.append(product)
+    for product in new:
+        product.slug = product.slug or slugify(product.title)[:160]
+
+    stats.created += len(new)
+    stats.updated += len(updates)
+    stats.category_ids.update(product.category_id for product in products)
+    if dry_run:
+        return
+
+    now = timezone.now()
+    with transaction.atomic():
+        if new:
+            # Before assign_skus, so generated SKUs skip the imported ones
+            advance_past([product.sku for product in new])
+            Product.objects.bulk_create(assign_skus(new))
+        if updates:
+            # bulk_update leaves auto_now alone, the API ETags need updated_at
+            for product in updates:
+                product.updated_at = now
+            Product.objects.bulk_update(updates, IMPORT_FIELDS + ['updated_at'])
+    if repriced:
+        invalidate_cart_badges(repriced)
+
+
+def import_products(rows, batch_size=500, dry_run=False):
+    """Upsert products from (line number, row) pairs in batches of ``batch_size``.
+
+    Each batch costs one SKU lookup, one bulk INSERT and one bulk UPDATE in
+    its own transaction, so the SQLite write lock is never held for long
+    and an error leaves earlier batches in place. Invalid rows are skipped
+    and collected in ``stats.errors``.
+    """
+    # Category slugs are not unique; rows naming a shared one are rejected
+    categories = {}
+    for slug, category_id in Category.objects.values_list('slug', 'id'):
+        categories[slug] = None if slug in categories else category_id
+    stats = ImportStats()
+    batch = []
+    for number, row in rows:
+        try:
+            if isinstance(row, RowError):
+                raise row
+            batch.append(parse_row(row, categories))
+        except RowError as e:
+            stats.errors.append((number, str(e)))
+            continue
+        if len(batch) >= batch_size:
+            _write_batch(batch, stats, dry_run)
+            batch = []
+    if batch:
+        _write_batch(batch, stats, dry_run)
+
+    if not dry_run and stats.created + stats.updated:
+        # Bulk writes send no signals, so do what the Product receivers would
+        invalidate_pages('catalog')
+        cache.delete_many(
+            [RELATED_INDEX_KEY.format(category_id=pk) for pk in stats.category_ids]
+            + ['store:category_count:{}'.format(pk) for pk in stats.category_ids]
+        )
+    return stats
+
+
+def export_rows(queryset=None, chunk_size=2000):
+    """Yield one dict per product in id order, streaming ``chunk_size`` rows at a time."""
+    queryset = Product.objects.all() if queryset is None else queryset
+    columns = [column if column != 'category' else 'category__slug' for column in PRODUCT_COLUMNS]
+    for values in queryset.order_by('id').values_list(*columns).iterator(chunk_size=chunk_size):
+        row = dict(zip(PRODUCT_COLUMNS, values))
+        row['price'] = str(row['price'])
+        row['detail_description'] = row['detail_description'] or ''
+        yield row
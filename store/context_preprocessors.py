@@ -1,18 +1,16 @@
-from .models import Category, Cart
+from .caching import get_cart_badge, get_category_menu
 
 
 def store_menu(request):
-    categories = Category.objects.filter(is_active=True)
     context = {
-        'categories_menu': categories,
+        'categories_menu': get_category_menu(),
     }
     return context
 
 def cart_menu(request):
     if request.user.is_authenticated:
-        cart_items= Cart.objects.filter(user=request.user)
         context = {
-            'cart_items': cart_items,
+            'cart_badge': get_cart_badge(request.user.id),
         }
     else:
         context = {}
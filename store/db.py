@@ -0,0 +1,29 @@
+from django.conf import settings
+
+
+# Applied to every new connection of the store.backends.sqlite3 engine,
+# override with settings.SQLITE_PRAGMAS
+DEFAULT_SQLITE_PRAGMAS = {
+    # Durable across application crashes; only an OS crash can lose the last commits
+    'synchronous': 'NORMAL',
+    # Wait for the write lock (ms) instead of failing with "database is locked"
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative values are KiB: 64 MB page cache per connection
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+}
+
+
+def get_sqlite_pragmas():
+    pragmas = dict(DEFAULT_SQLITE_PRAGMAS)
+    if getattr(settings, 'SQLITE_WAL', False):
+        # Readers no longer block the writer, and commits append to the WAL.
+        # The mode is stored in the database file and outlives the setting.
+        pragmas['journal_mode'] = 'WAL'
+    pragmas.update(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    return pragmas
+
+
+def pragma_statements(pragmas):
+    return ['PRAGMA {} = {}'.format(name, value) for name, value in pragmas.items()]
@@ -18,11 +18,17 @@ class ProductReviewForm(forms.ModelForm):
         
 class CheckoutForm(forms.Form):
     address = forms.ModelChoiceField(
-        queryset=Address.objects.all(),
+        queryset=Address.objects.none(),
         empty_label="Select an address",
         widget=forms.Select(attrs={'class': 'form-control'}),
     )
 
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only the shopper's own addresses are valid choices
+        if user is not None:
+            self.fields['address'].queryset = Address.objects.filter(user=user)
+
 
 class RegistrationForm(UserCreationForm):
     password1 = forms.CharField(label='Password', widget=forms.PasswordInput(attrs={'class':'form-control', 'placeholder':'Password'}))
@@ -0,0 +1,119 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+
+# Widths (px) generated for every uploaded image, each as JPEG and WebP
+DEFAULT_IMAGE_WIDTHS = (160, 320, 640, 1024)
+DEFAULT_IMAGE_QUALITY = 80
+DEFAULT_IMAGE_WORKERS = 2
+
+DERIVATIVES_DIR = 'derivatives'
+FORMATS = {'jpeg': 'jpg', 'webp': 'webp'}
+
+logger = logging.getLogger(__name__)
+
+
+def get_widths():
+    return tuple(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', DEFAULT_IMAGE_WIDTHS))
+
+
+def derivative_name(name, width, fmt):
+    """media/product/ring.jpg at 320px as WebP -> derivatives/product/ring-320w.webp"""
+    stem = os.path.splitext(name)[0]
+    return '{}/{}-{}w.{}'.format(DERIVATIVES_DIR, stem, width, FORMATS[fmt])
+
+
+def render_derivatives(media_root, name, widths, quality, force=False):
+    """Resize and re-encode one original into every width and format.
+
+    Runs in a worker process, so it only touches the filesystem and Pillow.
+    Widths wider than the original are written at the original size so the
+    srcset of a template never points at a missing file.
+    """
+    from PIL import Image, ImageOps
+
+    source = os.path.join(media_root, name)
+    targets = [
+        (width, fmt, os.path.join(media_root, derivative_name(name, width, fmt)))
+        for width in widths for fmt in FORMATS
+    ]
+    if not force and all(os.path.exists(path) for _, _, path in targets):
+        return 0
+
+    written = 0
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        for width, fmt, path in targets:
+            target_width = min(width, image.width)
+            height = max(1, round(image.height * target_width / image.width))
+            resized = image if target_width == image.width else image.resize((target_width, height), Image.LANCZOS)
+            if fmt == 'jpeg' and resized.mode != 'RGB':
+                resized = resized.convert('RGB')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if fmt == 'jpeg':
+                resized.save(path, 'JPEG', quality=quality, optimize=True, progressive=True)
+            else:
+                resized.save(path, 'WEBP', quality=quality, method=4)
+            written += 1
+    return written
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        # spawn keeps the workers free of the web process' threads and connections
+        _executor = ProcessPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', DEFAULT_IMAGE_WORKERS),
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+    return _executor
+
+
+def log_failure(name):
+    """Done-callback of a derivative job; nobody else ever looks at its result."""
+    def callback(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error('Could not write the derivatives of %s', name, exc_info=future.exception())
+    return callback
+
+
+def schedule_derivatives(field_file):
+    """Queue derivative generation for a freshly saved image once the transaction commits."""
+    if not field_file or not field_file.name or derivatives_ready(field_file.name):
+        return
+    name = field_file.name
+    args = (str(settings.MEDIA_ROOT), name, get_widths(),
+            getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', DEFAULT_IMAGE_QUALITY))
+
+    def submit():
+        if getattr(settings, 'IMAGE_DERIVATIVES_ASYNC', True):
+            get_executor().submit(render_derivatives, *args).add_done_callback(log_failure(name))
+        else:
+            render_derivatives(*args)
+
+    transaction.on_commit(submit)
+
+
+_ready = set()
+
+
+def derivatives_ready(name):
+    # Positive answers never change, so only missing derivatives are re-checked.
+    # The widest WebP is written last, so its presence means the set is complete.
+    if name in _ready:
+        return True
+    if default_storage.exists(derivative_name(name, get_widths()[-1], 'webp')):
+        _ready.add(name)
+        return True
+    return False
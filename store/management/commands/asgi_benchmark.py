@@ -0,0 +1,153 @@
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from store import popularity
+from store.models import Category, Product
+
+
+def percentile(latencies, p):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare requests/s and latency percentiles of the catalog pages served by the WSGI '
+        'and the ASGI handler, in process and against the configured database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help='Requests per run.')
+        parser.add_argument('--concurrency', type=int, default=32, help='WSGI threads / ASGI in-flight requests.')
+        parser.add_argument(
+            '--query-latency', type=float, default=2.0,
+            help='Milliseconds added to every query, standing in for a networked database.',
+        )
+        parser.add_argument('--page-cache', action='store_true', help='Keep the anonymous page cache enabled.')
+        parser.add_argument('--path', action='append', dest='paths', help='Path to request (repeatable).')
+
+    def default_paths(self):
+        category = Category.objects.filter(is_active=True).first()
+        product = Product.objects.filter(is_active=True).first()
+        if category is None or product is None:
+            raise CommandError('Needs an active category and product, or explicit --path options.')
+        return [
+            reverse('store:home'),
+            reverse('store:category-products', args=[category.slug]),
+            reverse('store:product-detail', args=[product.slug]),
+            reverse('store:cart-badge'),
+        ]
+
+    def run_wsgi(self, paths, total, concurrency):
+        handler = WSGIHandler()
+
+        def request(path):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': 'localhost', 'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(),
+                'wsgi.url_scheme': 'http', 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+                'wsgi.run_once': False, 'wsgi.version': (1, 0),
+            }
+            statuses = []
+            started = time.perf_counter()
+            response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            try:
+                b''.join(response)
+            finally:
+                response.close()
+            return time.perf_counter() - started, statuses[0].startswith('200')
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            started = time.perf_counter()
+            results = list(pool.map(request, (paths[i % len(paths)] for i in range(total))))
+            return results, time.perf_counter() - started
+
+    def run_asgi(self, paths, total, concurrency):
+        handler = ASGIHandler()
+
+        async def request(path):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+                'root_path': '', 'headers': [(b'host', b'localhost')],
+                'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+            }
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+            statuses = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # The client never disconnects
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            started = time.perf_counter()
+            await handler(scope, receive, send)
+            return time.perf_counter() - started, statuses[0] == 200
+
+        async def main():
+            queue = list(reversed([paths[i % len(paths)] for i in range(total)]))
+            results = []
+
+            async def client():
+                while queue:
+                    results.append(await request(queue.pop()))
+
+            started = time.perf_counter()
+            await asyncio.gather(*(client() for _ in range(concurrency)))
+            return results, time.perf_counter() - started
+
+        return asyncio.run(main())
+
+    def report(self, label, results, elapsed):
+        latencies = sorted(latency for latency, _ in results)
+        failed = sum(1 for _, ok in results if not ok)
+        self.stdout.write(
+            '{:<10} {:>8.1f} req/s   p50 {:>8.2f} ms   p99 {:>8.2f} ms   {} non-200'.format(
+                label, len(results) / elapsed, percentile(latencies, 0.50), percentile(latencies, 0.99), failed,
+            )
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or self.default_paths()
+        delay = options['query_latency'] / 1000
+
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow_query)
+
+        # Only the page cache is switched off, sessions keep their own cache
+        caches = None if options['page_cache'] else {
+            **settings.CACHES, 'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        }
+        if delay:
+            connection_created.connect(add_latency)
+        self.stdout.write('{} requests, {} concurrent, {:.1f} ms per query, paths: {}'.format(
+            options['requests'], options['concurrency'], options['query_latency'], ' '.join(paths)))
+        try:
+            with override_settings(**({'CACHES': caches} if caches else {})):
+                for label, runner in (('wsgi', self.run_wsgi), ('asgi', self.run_asgi)):
+                    runner(paths, len(paths), 1)  # warm up the URLconf, templates and connections
+                    self.report(label, *runner(paths, options['requests'], options['concurrency']))
+        finally:
+            connection_created.disconnect(add_latency)
+            # Benchmark traffic must not inflate the popularity ranking
+            with popularity.counter.lock:
+                popularity.counter.pending.clear()
@@ -0,0 +1,231 @@
+import json
+import random
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from store import popularity, profiling
+from store.models import Cart, Category, Order, Product, ProductReview
+
+
+# Scenario -> whether it needs a logged-in shopper
+SCENARIOS = {
+    'home': False,
+    'detail': False,
+    'category_products': False,
+    'cart': True,
+    'checkout': True,
+    'orders': True,
+}
+PERCENTILES = (50, 90, 95, 99)
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(latencies, elapsed, errors, query_counts, repeated):
+    latencies = sorted(latency * 1000 for latency in latencies)
+    summary = {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 3) if latencies else 0,
+            **{'p{}'.format(p): round(profiling.percentile(latencies, p), 3) for p in PERCENTILES},
+            'max': round(latencies[-1], 3) if latencies else 0,
+        },
+        'queries': None,
+    }
+    if query_counts:
+        summary['queries'] = {
+            'mean': round(sum(query_counts) / len(query_counts), 2),
+            'max': max(query_counts),
+            # Query shapes a single request ran PROFILING_DUPLICATE_MIN or more times
+            'repeated_shapes_max': max(repeated),
+        }
+    return summary
+
+
+class Command(BaseCommand):
+    help = (
+        'Request the home, detail, category, cart, checkout and orders pages with the data in the '
+        'database (see seed_data) and write latency percentiles, throughput and query counts per page '
+        'to a JSON report. Runs in process through the test client, or against a running server with --url.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS, dest='scenarios',
+                            help='Page to request (repeatable); all by default.')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per scenario first.')
+        parser.add_argument('--shoppers', type=int, default=20, help='Logged-in users the requests rotate through.')
+        parser.add_argument('--no-page-cache', action='store_true', help='Use a dummy cache backend (in process only).')
+        parser.add_argument('--url', help='Base URL of a running server sharing this database, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=8, help='Parallel requests with --url.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', '-o', help='Report path, by default benchmark-<time>.json.')
+        parser.add_argument('--compare', help='Earlier report to print the differences against.')
+
+    def fixtures(self, shoppers):
+        products = list(
+            Product.objects.filter(is_active=True, category__is_active=True).order_by('?').values_list('slug', flat=True)[:500]
+        )
+        categories = list(Category.objects.filter(is_active=True).order_by('?').values_list('slug', flat=True)[:200])
+        user_ids = list(Cart.objects.order_by().values_list('user_id', flat=True).distinct()[:shoppers])
+        users = list(User.objects.filter(id__in=user_ids) if user_ids else User.objects.all()[:shoppers])
+        if not (products and categories and users):
+            raise CommandError('Needs active products and categories and at least one user; run seed_data first.')
+        return products, categories, users
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Query counting works even with PROFILING_ENABLED = False
+        for connection in connections.all():
+            profiling.install(connection)
+        connection_created.connect(profiling.install, dispatch_uid='store.profiling')
+        scenarios = options['scenarios'] or list(SCENARIOS)
+        products, categories, users = self.fixtures(options['shoppers'])
+        anonymous = Client()
+        shoppers = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            shoppers.append(client)
+
+        def request_for(scenario):
+            """A (client, path) pair for one request of the scenario."""
+            if scenario == 'home':
+                path = reverse('store:home')
+            elif scenario == 'detail':
+                path = reverse('store:product-detail', args=[rng.choice(products)])
+            elif scenario == 'category_products':
+                path = reverse('store:category-products', args=[rng.choice(categories)])
+            else:
+                path = reverse('store:' + scenario)
+            return (rng.choice(shoppers) if SCENARIOS[scenario] else anonymous), path
+
+        # Only the page cache is switched off, sessions keep their own cache
+        caches = {**settings.CACHES, 'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        report = {
+            'created': timezone.now().isoformat(),
+            'revision': revision(),
+            'mode': 'http' if options['url'] else 'client',
+            'url': options['url'],
+            'concurrency': options['concurrency'] if options['url'] else 1,
+            'page_cache': not options['no_page_cache'],
+            'dataset': {
+                model.__name__: model.objects.count() for model in (Category, Product, User, Cart, Order, ProductReview)
+            },
+            'scenarios': {},
+        }
+        with override_settings(**({'CACHES': caches} if options['no_page_cache'] else {})):
+            try:
+                for scenario in scenarios:
+                    run = self.run_http if options['url'] else self.run_client
+                    run([request_for(scenario) for _ in range(options['warmup'])], options)
+                    report['scenarios'][scenario] = run(
+                        [request_for(scenario) for _ in range(options['requests'])], options,
+                    )
+                    self.print_row(scenario, report['scenarios'][scenario])
+            finally:
+                # Benchmark traffic must not inflate the popularity ranking
+                with popularity.counter.lock:
+                    popularity.counter.pending.clear()
+
+        path = options['output'] or 'benchmark-{:%Y%m%d-%H%M%S}.json'.format(timezone.localtime())
+        with open(path, 'w') as out:
+            json.dump(report, out, indent=2)
+        self.stdout.write('Report written to {}'.format(path))
+        if options['compare']:
+            self.compare(options['compare'], report)
+
+    def run_client(self, requests, options):
+        """Sequential requests through the test client, with the queries of each counted."""
+        minimum = getattr(settings, 'PROFILING_DUPLICATE_MIN', profiling.DEFAULT_DUPLICATE_MIN)
+        latencies, query_counts, repeated = [], [], []
+        errors = 0
+        started = time.perf_counter()
+        for client, path in requests:
+            request_started = time.perf_counter()
+            with profiling.profiled() as profile:
+                response = client.get(path)
+            latencies.append(time.perf_counter() - request_started)
+            errors += response.status_code != 200
+            query_counts.append(len(profile.queries))
+            repeated.append(len(profile.duplicates(minimum)))
+        return summarize(latencies, time.perf_counter() - started, errors, query_counts, repeated)
+
+    def run_http(self, requests, options):
+        """Concurrent requests against a running server; query counts are not visible from here."""
+        base = options['url'].rstrip('/')
+
+        def fetch(item):
+            client, path = item
+            cookie = client.cookies.get(settings.SESSION_COOKIE_NAME)
+            headers = {'Cookie': '{}={}'.format(settings.SESSION_COOKIE_NAME, cookie.value)} if cookie else {}
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(urllib.request.Request(base + path, headers=headers), timeout=60) as response:
+                    response.read()
+                    # A redirect, e.g. to the login page, is followed by urlopen but is not a success
+                    ok = response.status == 200 and response.geturl() == base + path
+            except (urllib.error.URLError, OSError):
+                ok = False
+            return time.perf_counter() - started, ok
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            started = time.perf_counter()
+            results = list(pool.map(fetch, requests))
+            elapsed = time.perf_counter() - started
+        return summarize([latency for latency, _ in results], elapsed, sum(not ok for _, ok in results), [], [])
+
+    def print_row(self, scenario, summary):
+        latency = summary['latency_ms']
+        queries = summary['queries']
+        self.stdout.write('{:<18} {:>8.1f} req/s   p50 {:>8.2f} ms   p95 {:>8.2f} ms   p99 {:>8.2f} ms   {}{} errors'.format(
+            scenario, summary['throughput_rps'], latency['p50'], latency['p95'], latency['p99'],
+            '{:>5.1f} queries   '.format(queries['mean']) if queries else '', summary['errors'],
+        ))
+
+    def compare(self, path, report):
+        try:
+            with open(path) as f:
+                previous = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError('Cannot read {}: {}'.format(path, e))
+
+        def change(old, new):
+            return '{:+.1f}%'.format((new - old) / old * 100) if old else 'n/a'
+
+        self.stdout.write('Compared with {} ({})'.format(path, previous.get('revision') or previous.get('created')))
+        for scenario, summary in report['scenarios'].items():
+            before = previous.get('scenarios', {}).get(scenario)
+            if not before:
+                continue
+            line = '{:<18} p95 {:>8.2f} -> {:>8.2f} ms ({})   {:>8.1f} -> {:>8.1f} req/s ({})'.format(
+                scenario, before['latency_ms']['p95'], summary['latency_ms']['p95'],
+                change(before['latency_ms']['p95'], summary['latency_ms']['p95']),
+                before['throughput_rps'], summary['throughput_rps'],
+                change(before['throughput_rps'], summary['throughput_rps']),
+            )
+            if before.get('queries') and summary['queries']:
+                line += '   queries {:.1f} -> {:.1f}'.format(before['queries']['mean'], summary['queries']['mean'])
+            self.stdout.write(line)
@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.images import DEFAULT_IMAGE_QUALITY, DEFAULT_IMAGE_WORKERS, get_widths, render_derivatives
+from store.models import BlogPost, Category, Product
+
+
+IMAGE_FIELDS = (
+    (Product, 'product_image'),
+    (Category, 'category_image'),
+    (BlogPost, 'image'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Generate resized JPEG/WebP derivatives for every product, category and blog image already in media/.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-encode derivatives that already exist.')
+        parser.add_argument(
+            '--workers', type=int,
+            default=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', DEFAULT_IMAGE_WORKERS),
+            help='Number of worker processes.',
+        )
+
+    def handle(self, *args, **options):
+        names = set()
+        for model, field in IMAGE_FIELDS:
+            names.update(
+                model.objects.exclude(**{field: ''}).exclude(**{field + '__isnull': True})
+                .values_list(field, flat=True).distinct().iterator()
+            )
+
+        media_root = str(settings.MEDIA_ROOT)
+        quality = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', DEFAULT_IMAGE_QUALITY)
+        started = time.monotonic()
+        written = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {
+                name: pool.submit(render_derivatives, media_root, name, get_widths(), quality, options['force'])
+                for name in sorted(names)
+            }
+            for name, future in futures.items():
+                try:
+                    written += future.result()
+                except (OSError, ValueError) as e:
+                    failed += 1
+                    self.stderr.write('{}: {}'.format(name, e))
+
+        self.stdout.write(self.style.SUCCESS(
+            'Processed {} images, wrote {} derivatives in {:.1f}s ({} failed).'.format(
+                len(names), written, time.monotonic() - started, failed)
+        ))
@@ -0,0 +1,59 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_io import guess_format
+from store.models import STATUS_CHOICES
+from store.order_io import FORMATS, encode_rows, export_rows, filter_orders
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError('Dates are YYYY-MM-DD, got {!r}.'.format(value))
+
+
+class Command(BaseCommand):
+    help = 'Stream orders, joined with their user, address and product, to a CSV or JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', default='-', help='File to write, or - for standard output.')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension, else csv.')
+        parser.add_argument('--status', action='append', choices=[value for value, _ in STATUS_CHOICES],
+                            help='Only orders with this status, may be given more than once.')
+        parser.add_argument('--since', type=parse_date, help='First local day to include, YYYY-MM-DD.')
+        parser.add_argument('--until', type=parse_date, help='Last local day to include, YYYY-MM-DD.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched from the database at a time.')
+
+    def handle(self, *args, **options):
+        path = options['output']
+        fmt = options['format'] or guess_format(path)
+        orders = filter_orders(statuses=options['status'], since=options['since'], until=options['until'])
+        started = time.perf_counter()
+        try:
+            stream = self.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(e)
+
+        count = 0
+
+        def counted(rows):
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield row
+
+        try:
+            for text in encode_rows(counted(export_rows(orders, options['chunk_size'])), fmt):
+                # Every piece ends in a newline, so OutputWrapper adds none
+                stream.write(text)
+        finally:
+            if stream is not self.stdout:
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        # The report goes to stderr so it never ends up in an export written to stdout
+        self.stderr.write('Exported {} orders in {:.2f}s ({:.0f} rows/s).'.format(
+            count, elapsed, count / elapsed if elapsed else 0))
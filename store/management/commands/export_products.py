@@ -0,0 +1,49 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_io import FORMATS, PRODUCT_COLUMNS, export_rows, guess_format
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Stream every product to a CSV or JSON Lines file that import_products can read back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', default='-', help='File to write, or - for standard output.')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension, else csv.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched from the database at a time.')
+        parser.add_argument('--active-only', action='store_true')
+
+    def handle(self, *args, **options):
+        path = options['output']
+        fmt = options['format'] or guess_format(path)
+        queryset = Product.objects.filter(is_active=True) if options['active_only'] else Product.objects.all()
+        started = time.perf_counter()
+        try:
+            stream = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(e)
+
+        count = 0
+        try:
+            if fmt == 'csv':
+                writer = csv.DictWriter(stream, fieldnames=PRODUCT_COLUMNS)
+                writer.writeheader()
+            for row in export_rows(queryset, options['chunk_size']):
+                if fmt == 'csv':
+                    writer.writerow(row)
+                else:
+                    stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+                count += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        # The report goes to stderr so it never ends up in an export written to stdout
+        self.stderr.write('Exported {} products in {:.2f}s ({:.0f} rows/s).'.format(
+            count, elapsed, count / elapsed if elapsed else 0))
@@ -0,0 +1,44 @@
+import sys
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_io import FORMATS, PRODUCT_COLUMNS, guess_format, import_products, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Create or update products from a CSV or JSON Lines file, matched on SKU. '
+        'Columns: {}; category is a category slug.'.format(', '.join(PRODUCT_COLUMNS))
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to read, or - for standard input.')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension, else csv.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows written per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and count without writing.')
+        parser.add_argument('--max-errors', type=int, default=20, help='Invalid rows listed in the report.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        started = time.perf_counter()
+        try:
+            stream = nullcontext(sys.stdin) if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        except OSError as e:
+            raise CommandError(e)
+        with stream as stream:
+            stats = import_products(read_rows(stream, fmt), max(options['batch_size'], 1), options['dry_run'])
+        elapsed = time.perf_counter() - started
+
+        for number, error in stats.errors[:options['max_errors']]:
+            self.stderr.write('line {}: {}'.format(number, error))
+        if len(stats.errors) > options['max_errors']:
+            self.stderr.write('... and {} more invalid rows'.format(len(stats.errors) - options['max_errors']))
+        self.stdout.write(self.style.SUCCESS(
+            '{}{} rows in {:.2f}s ({:.0f} rows/s): {} created, {} updated, {} skipped.'.format(
+                'Dry run: ' if options['dry_run'] else '', stats.rows, elapsed,
+                stats.rows / elapsed if elapsed else 0, stats.created, stats.updated, len(stats.errors),
+            )
+        ))
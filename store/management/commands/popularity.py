@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.popularity import rebuild_popularity
+
+
+class Command(BaseCommand):
+    # Buffered increments live in each server process, which flushes its own
+    # every POPULARITY_FLUSH_INTERVAL seconds and at exit, so there is
+    # nothing a separate command could flush
+    help = 'Rebuild popularity from wishlists and orders.'
+
+    def handle(self, *args, **options):
+        count = rebuild_popularity()
+        self.stdout.write(self.style.SUCCESS('Rebuilt popularity of {} products.'.format(count)))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.sessions import purge_expired
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired sessions in small transactions, pausing between them so checkouts and '
+        'other writers are not held up. Safe to run from cron while the site is live.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Sessions deleted per transaction.')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to wait between batches.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        deleted = purge_expired(batch_size=options['batch_size'], pause=options['pause'])
+        self.stdout.write(self.style.SUCCESS('Deleted {} expired sessions in {:.2f}s.'.format(
+            deleted, time.perf_counter() - started)))
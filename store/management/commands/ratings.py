@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute rating_avg, rating_count and the star histogram of every product from its reviews.'
+
+    def handle(self, *args, **options):
+        count = rebuild_ratings()
+        self.stdout.write(self.style.SUCCESS('Rebuilt ratings of {} products.'.format(count)))
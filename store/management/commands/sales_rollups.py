@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.sales import rebuild_sales
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the hourly and daily sales rollups from orders. Meant to run periodically '
+        'over the last days to pick up order changes made without signals.'
+    )
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument('--days', type=int, default=2, help='Rebuild this many local days, today included.')
+        group.add_argument('--all', action='store_true', help='Rebuild the rollups of every order.')
+
+    def handle(self, *args, **options):
+        since = None if options['all'] else timezone.now() - timedelta(days=max(options['days'], 1) - 1)
+        hourly, daily = rebuild_sales(since)
+        self.stdout.write(self.style.SUCCESS('Wrote {} hourly and {} daily rollup rows.'.format(hourly, daily)))
@@ -0,0 +1,40 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from store.models import Category
+from store.seeding import PASSWORD, SCALES, Seeder
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with synthetic categories, products, users, carts, orders and reviews '
+        'for load testing. Run it against a throwaway copy of the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small', help='Preset row counts.')
+        for model in SCALES['small']:
+            parser.add_argument('--' + model, type=int, help='Number of {}, overrides --scale.'.format(model))
+        parser.add_argument('--prefix', default='seed', help='Start of generated usernames and slugs.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT transaction.')
+        parser.add_argument('--days', type=int, default=180, help='Orders and reviews are spread over this many days.')
+
+    def handle(self, *args, **options):
+        counts = {model: options[model] if options[model] is not None else n for model, n in SCALES[options['scale']].items()}
+        if min(counts['categories'], counts['products'], counts['users']) < 1:
+            raise CommandError('Needs at least one category, product and user.')
+        prefix = options['prefix']
+        if (
+            Category.objects.filter(slug__startswith=prefix + '-category-').exists()
+            or User.objects.filter(username__startswith=prefix + '-user-').exists()
+        ):
+            raise CommandError('Data with the prefix "{}" exists already, choose another --prefix.'.format(prefix))
+
+        self.stdout.write('Seeding {}'.format(', '.join('{} {}'.format(n, model) for model, n in counts.items())))
+        Seeder(
+            counts, prefix=prefix, seed=options['seed'], batch_size=options['batch_size'], days=options['days'],
+            log=self.stdout.write,
+        ).run()
+        self.stdout.write('Users are {}-user-0 to {}-user-{}, password "{}".'.format(
+            prefix, prefix, counts['users'] - 1, PASSWORD))
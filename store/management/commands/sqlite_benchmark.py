@@ -0,0 +1,160 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.db import get_sqlite_pragmas, pragma_statements
+
+
+SCHEMA = [
+    'CREATE TABLE product (id INTEGER PRIMARY KEY, price REAL NOT NULL)',
+    'CREATE TABLE cart (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, product_id INTEGER NOT NULL, '
+    'quantity INTEGER NOT NULL, UNIQUE (user_id, product_id))',
+    'CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, product_id INTEGER NOT NULL, '
+    'quantity INTEGER NOT NULL)',
+]
+
+
+def setup_database(path, products):
+    conn = sqlite3.connect(path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.executemany('INSERT INTO product (id, price) VALUES (?, ?)', ((i, 10.0 + i % 50) for i in range(1, products + 1)))
+    conn.commit()
+    conn.close()
+
+
+class Worker(threading.Thread):
+    """Replays the storefront's transactions the way Django runs them.
+
+    Write transactions read before they write, which with a deferred
+    BEGIN turns into "database is locked" whenever another connection
+    holds the write lock.
+    """
+
+    def __init__(self, path, pragmas, begin, timeout, deadline, users, products, write_ratio, seed):
+        super().__init__(daemon=True)
+        self.path = path
+        self.pragmas = pragmas
+        self.begin = begin
+        self.timeout = timeout
+        self.deadline = deadline
+        self.users = users
+        self.products = products
+        self.write_ratio = write_ratio
+        self.random = random.Random(seed)
+        self.latencies = []
+        self.errors = 0
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        for statement in pragma_statements(self.pragmas):
+            conn.execute(statement)
+        return conn
+
+    def add_to_cart(self, conn, user_id):
+        product_id = self.random.randint(1, self.products)
+        conn.execute(self.begin)
+        row = conn.execute('SELECT id FROM cart WHERE user_id = ? AND product_id = ?', (user_id, product_id)).fetchone()
+        if row:
+            conn.execute('UPDATE cart SET quantity = quantity + 1 WHERE id = ?', (row[0],))
+        else:
+            conn.execute('INSERT INTO cart (user_id, product_id, quantity) VALUES (?, ?, 1)', (user_id, product_id))
+        conn.execute('COMMIT')
+
+    def checkout(self, conn, user_id):
+        conn.execute(self.begin)
+        lines = conn.execute('SELECT product_id, quantity FROM cart WHERE user_id = ?', (user_id,)).fetchall()
+        conn.executemany(
+            'INSERT INTO orders (user_id, product_id, quantity) VALUES (?, ?, ?)',
+            ((user_id, product_id, quantity) for product_id, quantity in lines),
+        )
+        conn.execute('DELETE FROM cart WHERE user_id = ?', (user_id,))
+        conn.execute('COMMIT')
+
+    def browse(self, conn, user_id):
+        conn.execute(
+            'SELECT SUM(c.quantity * p.price) FROM cart c JOIN product p ON p.id = c.product_id WHERE c.user_id = ?',
+            (user_id,),
+        ).fetchone()
+        conn.execute('SELECT id, price FROM product ORDER BY price DESC LIMIT 12').fetchall()
+
+    def run(self):
+        conn = self.connect()
+        while time.monotonic() < self.deadline:
+            user_id = self.random.randint(1, self.users)
+            roll = self.random.random()
+            started = time.perf_counter()
+            try:
+                if roll < self.write_ratio * 0.8:
+                    self.add_to_cart(conn, user_id)
+                elif roll < self.write_ratio:
+                    self.checkout(conn, user_id)
+                else:
+                    self.browse(conn, user_id)
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) and 'busy' not in str(e):
+                    raise
+                self.errors += 1
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+            self.latencies.append(time.perf_counter() - started)
+        conn.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare throughput and "database is locked" rates of concurrent cart/checkout '
+        'traffic on a scratch SQLite file, with SQLite defaults and with the tuned PRAGMAs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--write-ratio', type=float, default=0.3, help='Share of transactions that write.')
+        parser.add_argument(
+            '--baseline-timeout', type=float, default=5.0,
+            help='Lock wait (s) of the untuned run; 5 is the default of the sqlite3 module.',
+        )
+
+    def run_scenario(self, label, pragmas, begin, timeout, options):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.sqlite3')
+            setup_database(path, options['products'])
+            deadline = time.monotonic() + options['seconds']
+            workers = [
+                Worker(path, pragmas, begin, timeout, deadline, options['users'], options['products'], options['write_ratio'], seed)
+                for seed in range(options['threads'])
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        latencies = sorted(latency for worker in workers for latency in worker.latencies)
+        total = len(latencies)
+        errors = sum(worker.errors for worker in workers)
+
+        def percentile(p):
+            return latencies[min(total - 1, int(total * p))] * 1000 if total else 0.0
+
+        self.stdout.write(
+            '{:<10} {:>10.0f} tx/s {:>8.2f}% locked   p50 {:>7.2f} ms   p99 {:>7.2f} ms'.format(
+                label, (total - errors) / options['seconds'], 100.0 * errors / total if total else 0.0,
+                percentile(0.50), percentile(0.99),
+            )
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('{} threads, {:.0f}s per run, {:.0%} writes'.format(
+            options['threads'], options['seconds'], options['write_ratio']))
+        self.run_scenario('default', {}, 'BEGIN', options['baseline_timeout'], options)
+        # Same settings as the store.backends.sqlite3 engine on a server, with SQLITE_WAL on
+        tuned = {**get_sqlite_pragmas(), 'journal_mode': 'WAL'}
+        self.run_scenario('tuned', tuned, 'BEGIN IMMEDIATE', tuned.get('busy_timeout', 5000) / 1000, options)
@@ -0,0 +1,86 @@
+from django.db import migrations
+
+
+# Full-text index of products, kept in sync by triggers so that every write
+# path (forms, admin, bulk_create, raw updates) updates it incrementally.
+# rowid is the product id.
+# Later migrations that rebuild store_product on SQLite (AddField with a
+# default and the like) must drop the triggers first and recreate them after.
+TRIGGER_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS store_product_fts_insert AFTER INSERT ON store_product BEGIN
+        INSERT INTO store_product_fts (rowid, title, short_description, detail_description, category_title)
+        SELECT new.id, new.title, new.short_description, COALESCE(new.detail_description, ''), c.title
+        FROM store_category c WHERE c.id = new.category_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS store_product_fts_update
+    AFTER UPDATE OF title, short_description, detail_description, category_id ON store_product BEGIN
+        DELETE FROM store_product_fts WHERE rowid = old.id;
+        INSERT INTO store_product_fts (rowid, title, short_description, detail_description, category_title)
+        SELECT new.id, new.title, new.short_description, COALESCE(new.detail_description, ''), c.title
+        FROM store_category c WHERE c.id = new.category_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS store_product_fts_delete AFTER DELETE ON store_product BEGIN
+        DELETE FROM store_product_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS store_category_fts_update AFTER UPDATE OF title ON store_category BEGIN
+        UPDATE store_product_fts SET category_title = new.title
+        WHERE rowid IN (SELECT id FROM store_product WHERE category_id = new.id);
+    END
+    """,
+]
+
+DROP_TRIGGER_SQL = [
+    'DROP TRIGGER IF EXISTS store_category_fts_update',
+    'DROP TRIGGER IF EXISTS store_product_fts_delete',
+    'DROP TRIGGER IF EXISTS store_product_fts_update',
+    'DROP TRIGGER IF EXISTS store_product_fts_insert',
+]
+
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS store_product_fts USING fts5(
+        title, short_description, detail_description, category_title,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    *TRIGGER_SQL,
+    """
+    INSERT INTO store_product_fts (rowid, title, short_description, detail_description, category_title)
+    SELECT p.id, p.title, p.short_description, COALESCE(p.detail_description, ''), c.title
+    FROM store_product p INNER JOIN store_category c ON c.id = p.category_id
+    """,
+]
+
+DROP_SQL = [
+    *DROP_TRIGGER_SQL,
+    'DROP TABLE IF EXISTS store_product_fts',
+]
+
+
+def run_sqlite(statements):
+    def forwards(apps, schema_editor):
+        # FTS5 is SQLite only, other backends fall back to plain filtering
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return forwards
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_subscription'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(CREATE_SQL), run_sqlite(DROP_SQL)),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.2 on 2026-10-18 18:39
+
+from django.db import migrations, models
+
+
+def seed_product_sequence(apps, schema_editor):
+    # Continue after the highest numeric SKU (string ordering put "9" after "10")
+    Product = apps.get_model('store', 'Product')
+    SkuSequence = apps.get_model('store', 'SkuSequence')
+    skus = Product.objects.exclude(sku__isnull=True).values_list('sku', flat=True)
+    highest = max((int(sku) for sku in skus if sku.isdigit()), default=0)
+    SkuSequence.objects.create(name='product', next_value=highest + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SkuSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(seed_product_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 4.2.2 on 2026-10-18 18:51
+
+from importlib import import_module
+
+import django.core.validators
+from django.db import migrations, models
+
+
+product_search = import_module('store.migrations.0011_product_search')
+
+
+def fill_ratings(apps, schema_editor):
+    # Same aggregation as store.ratings.rebuild_ratings, on the historical models
+    from collections import Counter, defaultdict
+    from decimal import ROUND_HALF_UP, Decimal
+
+    Product = apps.get_model('store', 'Product')
+    ProductReview = apps.get_model('store', 'ProductReview')
+    histograms = defaultdict(Counter)
+    for product_id, rating in ProductReview.objects.values_list('product_id', 'rating').iterator():
+        histograms[product_id][min(max(rating, 1), 5)] += 1
+
+    updated = []
+    for product_id, histogram in histograms.items():
+        count = sum(histogram.values())
+        total = sum(stars * n for stars, n in histogram.items())
+        product = Product(id=product_id, rating_count=count)
+        product.rating_avg = (Decimal(total) / count).quantize(Decimal('0.01'), ROUND_HALF_UP)
+        for stars in range(1, 6):
+            setattr(product, 'stars_{}'.format(stars), histogram[stars])
+        updated.append(product)
+    fields = ['rating_avg', 'rating_count'] + ['stars_{}'.format(stars) for stars in range(1, 6)]
+    Product.objects.bulk_update(updated, fields, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_skusequence'),
+    ]
+
+    operations = [
+        # Adding columns with a default rebuilds store_product on SQLite
+        migrations.RunPython(
+            product_search.run_sqlite(product_search.DROP_TRIGGER_SQL),
+            product_search.run_sqlite(product_search.TRIGGER_SQL),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stars_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stars_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stars_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stars_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stars_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='productreview',
+            name='rating',
+            field=models.PositiveIntegerField(default=0, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', 'rating_avg'], name='product_cat_rating_idx'),
+        ),
+        migrations.RunPython(
+            product_search.run_sqlite(product_search.TRIGGER_SQL),
+            product_search.run_sqlite(product_search.DROP_TRIGGER_SQL),
+        ),
+        migrations.RunPython(fill_ratings, migrations.RunPython.noop),
+    ]
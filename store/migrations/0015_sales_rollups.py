@@ -0,0 +1,101 @@
+# Generated by Django 4.2.2 on 2026-10-18 18:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_unit_prices(apps, schema_editor):
+    # Best available guess for existing orders: the current product price
+    Order = apps.get_model('store', 'Order')
+    Product = apps.get_model('store', 'Product')
+    price = Product.objects.filter(id=models.OuterRef('product_id')).values('price')[:1]
+    Order.objects.filter(unit_price__isnull=True).update(unit_price=models.Subquery(price))
+
+
+def fill_rollups(apps, schema_editor):
+    # Same aggregation as store.sales.rebuild_sales, on the historical models
+    from django.db.models.functions import TruncDate, TruncHour
+    from django.utils import timezone
+
+    Order = apps.get_model('store', 'Order')
+    revenue = models.Sum(models.F('quantity') * models.F('unit_price'), output_field=models.DecimalField(max_digits=14, decimal_places=2))
+    for name, trunc in (('HourlySales', TruncHour), ('DailySales', TruncDate)):
+        model = apps.get_model('store', name)
+        rows = (
+            Order.objects.annotate(period=trunc('ordered_date', tzinfo=timezone.get_current_timezone()))
+            .values('period', 'product__category_id', 'status')
+            .annotate(n=models.Count('id'), units=models.Sum('quantity'), revenue=revenue)
+            .order_by()
+        )
+        model.objects.bulk_create([
+            model(period=row['period'], category_id=row['product__category_id'], status=row['status'],
+                  orders=row['n'], units=row['units'], revenue=row['revenue'] or 0)
+            for row in rows
+        ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_product_ratings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Accepted', 'Accepted'), ('Packed', 'Packed'), ('On The Way', 'On The Way'), ('Delivered', 'Delivered'), ('Cancelled', 'Cancelled')], max_length=50)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('period', models.DateField(verbose_name='Day')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily Sales',
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Accepted', 'Accepted'), ('Packed', 'Packed'), ('On The Way', 'On The Way'), ('Delivered', 'Delivered'), ('Cancelled', 'Cancelled')], max_length=50)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('period', models.DateTimeField(verbose_name='Hour')),
+            ],
+            options={
+                'verbose_name_plural': 'Hourly Sales',
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='unit_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Unit Price'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['ordered_date'], name='order_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='hourlysales',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='store.category'),
+        ),
+        migrations.AddField(
+            model_name='dailysales',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='store.category'),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlysales',
+            constraint=models.UniqueConstraint(fields=('period', 'category', 'status'), name='unique_hourly_sales'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('period', 'category', 'status'), name='unique_daily_sales'),
+        ),
+        migrations.RunPython(fill_unit_prices, migrations.RunPython.noop),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
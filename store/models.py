@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.contrib.auth import get_user_model
+from django.core.validators import MaxValueValidator, MinValueValidator
 
 
 # Create your models here.
@@ -27,17 +28,40 @@ class Category(models.Model):
     class Meta:
         verbose_name_plural = 'Categories'
         ordering = ('-created_at', )
+        # Partial indexes: Django filters booleans as a bare "WHERE is_active",
+        # which SQLite can only match against an index condition
+        indexes = [
+            models.Index(fields=['created_at'], condition=models.Q(is_active=True), name='category_active_created_idx'),
+            models.Index(fields=['created_at'], condition=models.Q(is_active=True, is_featured=True), name='category_featured_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class SkuSequence(models.Model):
+    # Counter row handed out in blocks by store.sku
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.PositiveBigIntegerField(default=1)
+
+    def __str__(self):
+        return self.name
+
+
 class Product(models.Model):
     title = models.CharField(max_length=150, verbose_name="Product Title")
     slug = models.SlugField(max_length=160, verbose_name="Product Slug")
     sku = models.CharField(max_length=255, unique=True, verbose_name="Unique Product ID (SKU)", null=True)
     short_description = models.TextField(verbose_name="Short Description")
     popularity = models.PositiveIntegerField(default=0)
+    # Review aggregates, kept current by store.ratings from the ProductReview signals
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
     detail_description = models.TextField(blank=True, null=True, verbose_name="Detail Description")
     product_image = models.ImageField(upload_to='product', blank=True, null=True, verbose_name="Product Image")
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -50,16 +74,32 @@ class Product(models.Model):
     class Meta:
         verbose_name_plural = 'Products'
         ordering = ('-created_at', )
+        # Partial indexes over active products, see Category.Meta
+        indexes = [
+            # Category listing, one index per sort key (the id tiebreaker is implicit)
+            models.Index(fields=['category', 'created_at'], condition=models.Q(is_active=True), name='product_cat_created_idx'),
+            models.Index(fields=['category', 'popularity'], condition=models.Q(is_active=True), name='product_cat_popularity_idx'),
+            models.Index(fields=['category', 'price'], condition=models.Q(is_active=True), name='product_cat_price_idx'),
+            models.Index(fields=['category', 'rating_avg'], condition=models.Q(is_active=True), name='product_cat_rating_idx'),
+            # Featured products on the home page
+            models.Index(fields=['created_at'], condition=models.Q(is_active=True, is_featured=True), name='product_featured_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+    @property
+    def rating_histogram(self):
+        """(stars, count, percent) from 5 stars down to 1."""
+        return [
+            (stars, count, round(100 * count / self.rating_count) if self.rating_count else 0)
+            for stars, count in ((n, getattr(self, 'stars_{}'.format(n))) for n in range(5, 0, -1))
+        ]
+
     def save(self, *args, **kwargs):
         if not self.sku:  # Only generate SKU if it's not already set (i.e., it's a new product)
-            last_product = Product.objects.order_by('-sku').first()
-            if last_product:
-                self.sku = str(int(last_product.sku) + 1)
-            else:
-                self.sku = '1'
+            from .sku import next_sku
+            self.sku = next_sku()
         super().save(*args, **kwargs)
 
 
@@ -70,12 +110,24 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created Date")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated Date")
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_cart_user_product'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='cart_user_created_idx'),
+        ]
+
     def __str__(self):
         return str(self.user)
     
     # Creating Model Property to calculate Quantity x Price
+    # Uses the line_total annotation from store.cart.cart_lines when present
     @property
     def total_price(self):
+        line_total = getattr(self, 'line_total', None)
+        if line_total is not None:
+            return line_total
         return self.quantity * self.product.price
 
 
@@ -93,22 +145,75 @@ class Order(models.Model):
     address = models.ForeignKey(Address, verbose_name="Shipping Address", on_delete=models.CASCADE)
     product = models.ForeignKey(Product, verbose_name="Product", on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(verbose_name="Quantity")
+    # Price paid per unit, so revenue does not follow later price changes
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="Unit Price")
     ordered_date = models.DateTimeField(auto_now_add=True, verbose_name="Ordered Date")
     status = models.CharField(
         choices=STATUS_CHOICES,
         max_length=50,
         default="Pending"
         )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'ordered_date'], name='order_user_date_idx'),
+            models.Index(fields=['ordered_date'], name='order_date_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.unit_price is None:
+            self.unit_price = self.product.price
+        super().save(*args, **kwargs)
+
+
+class SalesRollup(models.Model):
+    """Order totals of one period, category and status, maintained by store.sales.
+
+    Counters are signed so that applying deltas can never trip a CHECK
+    constraint, even if a bulk update slipped past the signals.
+    """
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    status = models.CharField(choices=STATUS_CHOICES, max_length=50)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        abstract = True
+
+
+class HourlySales(SalesRollup):
+    period = models.DateTimeField(verbose_name="Hour")
+
+    class Meta:
+        verbose_name_plural = 'Hourly Sales'
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'category', 'status'], name='unique_hourly_sales'),
+        ]
+
+
+class DailySales(SalesRollup):
+    period = models.DateField(verbose_name="Day")
+
+    class Meta:
+        verbose_name_plural = 'Daily Sales'
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'category', 'status'], name='unique_daily_sales'),
+        ]
+
 class ProductReview(models.Model):
     product = models.ForeignKey(Product, related_name='reviews', on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    rating = models.PositiveIntegerField(default=0)
+    rating = models.PositiveIntegerField(default=0, validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField()
     date_posted = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         verbose_name_plural = 'Reviews'
         ordering = ('-date_posted', )
+        indexes = [
+            models.Index(fields=['product', 'date_posted'], name='review_product_date_idx'),
+        ]
 
     def __str__(self):
         return f'Review by {self.user.username} for {self.product.title}'
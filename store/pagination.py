@@ -0,0 +1,143 @@
+import base64
+import binascii
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+# Sort options of the listing pages: (field, descending)
+SORT_KEYS = {
+    'default': ('created_at', True),
+    'popularity': ('popularity', True),
+    'rating': ('rating_avg', True),
+    'low-high': ('price', False),
+    'high-low': ('price', True),
+}
+
+APPROXIMATE_COUNT_TIMEOUT = 60 * 10
+
+# Largest integer SQLite (and a BIGINT column) can store
+MAX_DB_INT = 2 ** 63 - 1
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(direction, value, pk):
+    payload = json.dumps({'d': direction, 'v': value, 'id': pk}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction, value, pk = payload['d'], payload['v'], payload['id']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor(token)
+    # _cursor() always writes the value as a string and the id as an integer
+    if direction not in ('next', 'prev') or not isinstance(value, str):
+        raise InvalidCursor(token)
+    if type(pk) is not int or not 0 < pk <= MAX_DB_INT:
+        raise InvalidCursor(token)
+    return direction, value, pk
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor, approximate_count=None):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.approximate_count = approximate_count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Cursor pagination over ``(sort field, id)``.
+
+    Every page is an indexed range scan with LIMIT, so deep pages cost the
+    same as the first one and no COUNT(*) is needed to render them.
+    """
+
+    def __init__(self, queryset, sort='default', per_page=12, count_cache_key=None, sort_keys=SORT_KEYS):
+        # Unknown sort names fall back to the first key
+        self.field, self.descending = sort_keys.get(sort) or next(iter(sort_keys.values()))
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count_cache_key = count_cache_key
+
+    def _ordering(self, descending):
+        prefix = '-' if descending else ''
+        return (prefix + self.field, prefix + 'id')
+
+    def _seek(self, value, pk, descending):
+        op = 'lt' if descending else 'gt'
+        return Q(**{'{}__{}'.format(self.field, op): value}) | Q(**{self.field: value, 'id__' + op: pk})
+
+    def _clean_value(self, value):
+        """The sort value of a cursor as the field's type; raises ValidationError if it can't be one."""
+        field = self.queryset.model._meta.get_field(self.field)
+        value = field.clean(value, None)
+        # Not caught by the field validators on SQLite, but it can't bind the value
+        if isinstance(value, int) and not -MAX_DB_INT - 1 <= value <= MAX_DB_INT:
+            raise ValidationError('Out of range.')
+        return value
+
+    def _cursor(self, direction, obj):
+        value = self.queryset.model._meta.get_field(self.field).value_to_string(obj)
+        return encode_cursor(direction, value, obj.pk)
+
+    def approximate_count(self):
+        """Total rows, cached for a while since listings only show it as a hint."""
+        if self.count_cache_key is None:
+            return None
+        count = cache.get(self.count_cache_key)
+        if count is None:
+            count = self.queryset.count()
+            cache.set(self.count_cache_key, count, APPROXIMATE_COUNT_TIMEOUT)
+        return count
+
+    def get_page(self, token=None):
+        direction, value, pk = 'next', None, None
+        if token:
+            try:
+                direction, value, pk = decode_cursor(token)
+                value = self._clean_value(value)
+            except (InvalidCursor, ValidationError):
+                # Tampered cursors, and ones from another sort order, start over
+                direction, value, pk = 'next', None, None
+
+        # Walking backwards reads the index in the opposite order
+        descending = self.descending if direction == 'next' else not self.descending
+        queryset = self.queryset.order_by(*self._ordering(descending))
+        if pk is not None:
+            queryset = queryset.filter(self._seek(value, pk, descending))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'next':
+            has_next, has_previous = has_more, pk is not None
+        else:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+
+        return KeysetPage(
+            rows,
+            has_next=has_next and bool(rows),
+            has_previous=has_previous and bool(rows),
+            next_cursor=self._cursor('next', rows[-1]) if rows else None,
+            previous_cursor=self._cursor('prev', rows[0]) if rows else None,
+            approximate_count=self.approximate_count(),
+        )
@@ -0,0 +1,145 @@
+import atexit
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .caching import stale_timeout
+from .models import Category, Order, Product
+from .related import RELATED_INDEX_KEY
+
+
+# How much each shopper signal adds to Product.popularity
+DEFAULT_WEIGHTS = {
+    'detail_view': 1,
+    'add_to_cart': 3,
+    'wishlist': 5,
+    'purchase': 10,
+}
+
+# Seconds between two automatic flushes of the buffered increments
+DEFAULT_FLUSH_INTERVAL = 30
+
+PRODUCT_ID_KEY = 'store:product_id:{slug}'
+PRODUCT_ID_TIMEOUT = 60 * 60
+
+
+def get_weights():
+    return {**DEFAULT_WEIGHTS, **getattr(settings, 'POPULARITY_WEIGHTS', {})}
+
+
+class PopularityCounter:
+    """Buffers popularity increments in process memory and writes them in batches.
+
+    Increments are applied with ``F('popularity') + n`` so concurrent
+    processes never lose each other's updates, and ``updated_at`` is left
+    alone because ``QuerySet.update`` does not touch auto_now fields.
+
+    Every process flushes its own buffer, on the first signal after the
+    flush interval and at exit; no other process can reach it. A process
+    that dies without exiting loses at most one interval of increments.
+    """
+
+    def __init__(self, flush_interval=None):
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pending = defaultdict(int)
+        self.last_flush = time.monotonic()
+
+    def get_flush_interval(self):
+        if self.flush_interval is not None:
+            return self.flush_interval
+        return getattr(settings, 'POPULARITY_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+    def record(self, product_id, signal, times=1):
+        weight = get_weights()[signal] * times
+        if not weight:
+            return
+        with self.lock:
+            self.pending[product_id] += weight
+            due = time.monotonic() - self.last_flush >= self.get_flush_interval()
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered increments, one UPDATE per distinct increment."""
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(int)
+            self.last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        by_increment = defaultdict(list)
+        for product_id, increment in pending.items():
+            by_increment[increment].append(product_id)
+
+        try:
+            with transaction.atomic():
+                for increment, product_ids in by_increment.items():
+                    Product.objects.filter(id__in=product_ids).update(popularity=F('popularity') + increment)
+        except Exception:
+            # Nothing was written; the next flush tries again
+            with self.lock:
+                for product_id, increment in pending.items():
+                    self.pending[product_id] += increment
+            raise
+
+        # The related products ranking depends on popularity
+        category_ids = (
+            Product.objects.filter(id__in=list(pending)).order_by()
+            .values_list('category_id', flat=True).distinct()
+        )
+        cache.delete_many([RELATED_INDEX_KEY.format(category_id=category_id) for category_id in category_ids])
+        return len(pending)
+
+
+counter = PopularityCounter()
+atexit.register(counter.flush)
+
+
+def record(product_id, signal, times=1):
+    counter.record(product_id, signal, times)
+
+
+def record_cached_detail_view(request, slug):
+    """Count a detail page served from the page cache, which only knows the slug."""
+    key = PRODUCT_ID_KEY.format(slug=slug)
+    product_id = cache.get(key)
+    if product_id is None:
+        product_id = Product.objects.filter(slug=slug).values_list('id', flat=True).first()
+        if product_id is None:
+            return
+        cache.set(key, product_id, stale_timeout(PRODUCT_ID_TIMEOUT))
+    record(product_id, 'detail_view')
+
+
+def rebuild_popularity():
+    """Recompute popularity from the signals that are stored in the database.
+
+    Detail views and add-to-cart clicks are not persisted, so a rebuild only
+    counts wishlists and purchased quantities, and increments still buffered
+    in other processes land on top of the rebuilt values.
+    """
+    weights = get_weights()
+    counter.flush()
+    products = Product.objects.annotate(wishlist_count=Count('wishlists')).values_list('id', 'wishlist_count')
+    purchases = dict(
+        Order.objects.exclude(status='Cancelled').values('product_id')
+        .annotate(units=Sum('quantity')).values_list('product_id', 'units')
+    )
+
+    updated = []
+    for product_id, wishlist_count in products.iterator():
+        popularity = wishlist_count * weights['wishlist'] + purchases.get(product_id, 0) * weights['purchase']
+        updated.append(Product(id=product_id, popularity=popularity))
+    with transaction.atomic():
+        Product.objects.bulk_update(updated, ['popularity'], batch_size=500)
+    cache.delete_many([
+        RELATED_INDEX_KEY.format(category_id=category_id)
+        for category_id in Category.objects.values_list('id', flat=True)
+    ])
+    return len(updated)
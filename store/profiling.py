@@ -0,0 +1,223 @@
+"""Per-view request profiling: wall time, queries and repeated (N+1) queries.
+
+ProfilingMiddleware times every request and, through a database execute
+wrapper, each query it runs, including those run on other threads through
+sync_to_async (the current request travels in a context variable).
+Summaries of the last PROFILING_WINDOW requests of every view are kept in
+process memory and shown on the custom_admin performance page. Slow
+requests can also be sampled to a JSON Lines file.
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
+
+
+# Requests kept per view for the percentiles
+DEFAULT_WINDOW = 1000
+# A query shape run this many times by one request is reported as N+1
+DEFAULT_DUPLICATE_MIN = 3
+# Distinct repeated query shapes remembered per view
+MAX_DUPLICATES = 20
+
+# Profiles of the enclosing profiled() blocks, innermost last
+_current = ContextVar('store_profiling_request', default=())
+
+_IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def fingerprint(sql):
+    """The shape of a query: literals and IN lists of any length collapse to placeholders."""
+    return _LITERAL.sub('?', _IN_LIST.sub('(%s...)', sql))
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class RequestProfile:
+    def __init__(self):
+        # (sql, seconds) pairs; list.append is safe from several pool threads
+        self.queries = []
+
+    def query_time(self):
+        return sum(seconds for _, seconds in self.queries)
+
+    def duplicates(self, minimum):
+        counts = Counter(fingerprint(sql) for sql, _ in self.queries)
+        return {shape: n for shape, n in counts.items() if n >= minimum}
+
+
+class ViewStats:
+    def __init__(self, window):
+        self.requests = 0
+        # (wall ms, queries, query ms) of the most recent requests
+        self.samples = deque(maxlen=window)
+        # query shape -> [requests that repeated it, most repeats in one request]
+        self.duplicates = {}
+
+    def summary(self):
+        walls = sorted(sample[0] for sample in self.samples)
+        queries = sorted(sample[1] for sample in self.samples)
+        query_ms = sorted(sample[2] for sample in self.samples)
+        n = len(self.samples) or 1
+        return {
+            'requests': self.requests,
+            'window': len(self.samples),
+            'wall_p50': percentile(walls, 50),
+            'wall_p95': percentile(walls, 95),
+            'wall_p99': percentile(walls, 99),
+            'queries_mean': sum(queries) / n,
+            'queries_max': queries[-1] if queries else 0,
+            'query_ms_p95': percentile(query_ms, 95),
+            'db_share': sum(query_ms) / sum(walls) if sum(walls) else 0,
+            'duplicates': sorted(
+                ({'sql': shape, 'requests': hits, 'max': most} for shape, (hits, most) in self.duplicates.items()),
+                key=lambda row: -row['requests'],
+            ),
+        }
+
+
+class ProfileStats:
+    """Rolling per-view summaries, shared by every thread of the process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+        self.started = timezone.now()
+
+    def record(self, view_name, wall_ms, profile, duplicates):
+        window = getattr(settings, 'PROFILING_WINDOW', DEFAULT_WINDOW)
+        with self.lock:
+            stats = self.views.get(view_name)
+            if stats is None:
+                stats = self.views[view_name] = ViewStats(window)
+            stats.requests += 1
+            stats.samples.append((wall_ms, len(profile.queries), profile.query_time() * 1000))
+            for shape, n in duplicates.items():
+                if shape in stats.duplicates:
+                    hits, most = stats.duplicates[shape]
+                    stats.duplicates[shape] = [hits + 1, max(most, n)]
+                elif len(stats.duplicates) < MAX_DUPLICATES:
+                    stats.duplicates[shape] = [1, n]
+
+    def report(self):
+        """One summary per view, slowest p95 first."""
+        with self.lock:
+            rows = [dict(view=name, **stats.summary()) for name, stats in self.views.items()]
+        return sorted(rows, key=lambda row: -row['wall_p95'])
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+            self.started = timezone.now()
+
+
+stats = ProfileStats()
+_log_lock = threading.Lock()
+
+
+def _record_query(execute, sql, params, many, context):
+    profiles = _current.get()
+    if not profiles:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        for profile in profiles:
+            profile.queries.append((sql, elapsed))
+
+
+@contextmanager
+def profiled():
+    """Record the queries run inside the block, in this context and the pool threads it starts."""
+    profile = RequestProfile()
+    token = _current.set(_current.get() + (profile,))
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+
+
+def install(connection, **kwargs):
+    # connection_created receiver, connected by StoreConfig.ready()
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def log_slow_request(request, response, view_name, wall_ms, profile, duplicates):
+    entry = {
+        'time': timezone.now().isoformat(),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': view_name,
+        'status': response.status_code,
+        'wall_ms': round(wall_ms, 2),
+        'queries': len(profile.queries),
+        'query_ms': round(profile.query_time() * 1000, 2),
+        'duplicates': duplicates,
+    }
+    with _log_lock, open(settings.PROFILING_SLOW_LOG, 'a', encoding='utf-8') as log:
+        log.write(json.dumps(entry) + '\n')
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    """Feed ``stats`` with the timings of every request; list it above all but the cheapest middleware.
+
+    Wall time ends when the view and the middleware below it return, so
+    the body of a StreamingHttpResponse is not included. Under ASGI the
+    middleware runs async, so it doesn't force the chain below it onto a
+    thread per request.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with profiled() as profile:
+            response = self.get_response(request)
+        self.record(request, response, started, profile)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with profiled() as profile:
+            response = await self.get_response(request)
+        self.record(request, response, started, profile)
+        return response
+
+    def record(self, request, response, started, profile):
+        wall_ms = (time.perf_counter() - started) * 1000
+
+        # resolver_match is unset when no URL matched
+        view_name = request.resolver_match.view_name if request.resolver_match else '<unresolved>'
+        duplicates = profile.duplicates(getattr(settings, 'PROFILING_DUPLICATE_MIN', DEFAULT_DUPLICATE_MIN))
+        stats.record(view_name, wall_ms, profile, duplicates)
+
+        if (
+            getattr(settings, 'PROFILING_SLOW_LOG', None)
+            and wall_ms >= getattr(settings, 'PROFILING_SLOW_MS', 500)
+            and random.random() < getattr(settings, 'PROFILING_SAMPLE_RATE', 1.0)
+        ):
+            log_slow_request(request, response, view_name, wall_ms, profile, duplicates)
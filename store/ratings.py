@@ -0,0 +1,68 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, FloatField, Func, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from .models import Product, ProductReview
+
+
+STARS = range(1, 6)
+
+
+def star_field(rating):
+    # Legacy ratings outside 1-5 count towards the nearest bucket
+    return 'stars_{}'.format(min(max(rating, 1), 5))
+
+
+def rounded_average(total, count):
+    # Rounded to two places in SQL; 0 without ratings
+    return Coalesce(
+        Func(Cast(total, FloatField()) / NullIf(count, 0), Value(2), function='ROUND', output_field=DecimalField()),
+        Value(0), output_field=DecimalField(),
+    )
+
+
+def apply_rating_changes(product_id, added=(), removed=()):
+    """Add and remove ratings of one product in a single atomic UPDATE.
+
+    Counts are adjusted with F() so concurrent reviews never overwrite each
+    other. The average is rounded to two places in SQL, because stored values
+    must equal what is read back for keyset cursors on rating_avg to work.
+    """
+    deltas = Counter()
+    for rating in added:
+        deltas[star_field(rating)] += 1
+    for rating in removed:
+        deltas[star_field(rating)] -= 1
+    if not any(deltas.values()):
+        return
+
+    stars = {'stars_{}'.format(n): F('stars_{}'.format(n)) + deltas['stars_{}'.format(n)] for n in STARS}
+    count = F('rating_count') + sum(deltas.values())
+    total = sum(stars['stars_{}'.format(n)] * n for n in STARS)
+    # The right-hand sides see the old row, so the new values are spelled out
+    Product.objects.filter(id=product_id).update(rating_count=count, rating_avg=rounded_average(total, count), **stars)
+
+
+def rebuild_ratings():
+    """Recompute the review aggregates of every product with two UPDATE statements.
+
+    The histogram comes from correlated counts answered by
+    review_product_date_idx; count and average are then derived from it.
+    """
+    reviews = ProductReview.objects.filter(product=OuterRef('pk')).order_by().values('product')
+
+    def counted(condition):
+        rows = reviews.filter(condition).annotate(n=Count('*')).values('n')
+        return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+    # Legacy ratings outside 1-5 count towards the nearest bucket, like star_field()
+    conditions = {1: Q(rating__lte=1), 5: Q(rating__gte=5)}
+    stars = {'stars_{}'.format(n): counted(conditions.get(n, Q(rating=n))) for n in STARS}
+    count = sum(F('stars_{}'.format(n)) for n in STARS)
+    total = sum(F('stars_{}'.format(n)) * n for n in STARS)
+    with transaction.atomic():
+        updated = Product.objects.update(**stars)
+        Product.objects.update(rating_count=count, rating_avg=rounded_average(total, count))
+    return updated
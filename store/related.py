@@ -0,0 +1,62 @@
+from django.core.cache import cache
+
+from .caching import stale_timeout
+from .models import Product
+
+
+# Number of related products shown on the detail page
+RELATED_PRODUCTS_LIMIT = 8
+
+RELATED_INDEX_KEY = 'store:related:category:{category_id}'
+RELATED_INDEX_TIMEOUT = 60 * 60 * 24
+
+# Most popular first, newest first among equally popular products
+RELATED_ORDERING = ('-popularity', '-created_at', '-id')
+
+
+def _rank_key(product):
+    return (product.popularity, product.created_at, product.id)
+
+
+def build_related_index(category_id):
+    """Cache the ids and ranks of the top ranked active products of a category.
+
+    Only (popularity, created_at, id) tuples are cached, never model
+    instances, so entries stay small and the rows are always read fresh.
+    One extra product is kept so that every product of the category still
+    gets a full list after excluding itself.
+    """
+    ranked = list(
+        Product.objects.filter(is_active=True, category_id=category_id)
+        .order_by(*RELATED_ORDERING).values_list('popularity', 'created_at', 'id')[:RELATED_PRODUCTS_LIMIT + 1]
+    )
+    cache.set(RELATED_INDEX_KEY.format(category_id=category_id), ranked, stale_timeout(RELATED_INDEX_TIMEOUT))
+    return ranked
+
+
+def get_related_products(product):
+    ranked = cache.get(RELATED_INDEX_KEY.format(category_id=product.category_id))
+    if ranked is None:
+        ranked = build_related_index(product.category_id)
+    ids = [pk for _, _, pk in ranked if pk != product.id][:RELATED_PRODUCTS_LIMIT]
+    # The rows are read by primary key; one deactivated since the index was built is dropped
+    products = Product.objects.filter(is_active=True).in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
+
+
+def update_related_index(product, previous_category_id=None):
+    """Refresh the cached lists a saved or deleted product can affect."""
+    if previous_category_id is not None and previous_category_id != product.category_id:
+        cache.delete(RELATED_INDEX_KEY.format(category_id=previous_category_id))
+
+    ranked = cache.get(RELATED_INDEX_KEY.format(category_id=product.category_id))
+    if ranked is None:
+        # Built lazily on the next detail page of that category
+        return
+
+    listed = any(pk == product.id for _, _, pk in ranked)
+    qualifies = product.is_active and (
+        len(ranked) <= RELATED_PRODUCTS_LIMIT or _rank_key(product) > ranked[-1]
+    )
+    if listed or qualifies:
+        build_related_index(product.category_id)
@@ -0,0 +1,124 @@
+from collections import defaultdict, namedtuple
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from .models import DailySales, HourlySales, Order
+
+
+# The fields of an order that its rollup rows depend on
+Sale = namedtuple('Sale', 'ordered_date category_id status quantity unit_price')
+
+REVENUE = Sum(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def sale_of(order):
+    return Sale(order.ordered_date, order.product.category_id, order.status, order.quantity, order.unit_price)
+
+
+def previous_sale(order_id):
+    row = (
+        Order.objects.filter(pk=order_id)
+        .values_list('ordered_date', 'product__category_id', 'status', 'quantity', 'unit_price').first()
+    )
+    return Sale(*row) if row else None
+
+
+def product_sales(products):
+    """Sales of every order of ``products`` (ids or a queryset), under the products' current category."""
+    rows = (
+        Order.objects.filter(product__in=products)
+        .values_list('ordered_date', 'product__category_id', 'status', 'quantity', 'unit_price')
+    )
+    return [Sale(*row) for row in rows.iterator()]
+
+
+def move_sales(sales, category_id):
+    """Move ``sales`` from the category they were recorded under to ``category_id``.
+
+    Rollups follow the current category of the product, like rebuild_sales(),
+    so a product changing category takes its past orders along.
+    """
+    moved = [sale for sale in sales if sale.category_id != category_id]
+    apply_sales(added=[sale._replace(category_id=category_id) for sale in moved], removed=moved)
+
+
+def buckets(moment):
+    """Local hour and day of a timestamp, matching TruncHour/TruncDate in the current time zone."""
+    local = timezone.localtime(moment)
+    return local.replace(minute=0, second=0, microsecond=0), local.date()
+
+
+def apply_sales(added=(), removed=(), create=True):
+    """Add and remove sales from the hourly and daily rollups.
+
+    Deltas are summed per row first, then applied with F() increments, so
+    a checkout touches one row per category rather than one per order line
+    and concurrent writers never lose each other's updates. With
+    ``create=False`` missing rows are left missing instead of created.
+    """
+    deltas = defaultdict(lambda: [0, 0, Decimal(0)])
+    for sales, sign in ((added, 1), (removed, -1)):
+        for sale in sales:
+            hour, day = buckets(sale.ordered_date)
+            for model, period in ((HourlySales, hour), (DailySales, day)):
+                delta = deltas[model, period, sale.category_id, sale.status]
+                delta[0] += sign
+                delta[1] += sign * sale.quantity
+                delta[2] += sign * sale.quantity * (sale.unit_price or 0)
+
+    for (model, period, category_id, status), (orders, units, revenue) in deltas.items():
+        if not (orders or units or revenue):
+            continue
+        key = {'period': period, 'category_id': category_id, 'status': status}
+        increments = {'orders': F('orders') + orders, 'units': F('units') + units, 'revenue': F('revenue') + revenue}
+        if model.objects.filter(**key).update(**increments) or not create:
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(orders=orders, units=units, revenue=revenue, **key)
+        except IntegrityError:
+            # Another request created the row in the meantime
+            model.objects.filter(**key).update(**increments)
+
+
+def rebuild_sales(since=None):
+    """Recompute the rollups of every order placed at or after ``since`` (all orders if None).
+
+    Run periodically over the last day or two to pick up changes that
+    bypass the signals, such as QuerySet.update() on Order.status.
+    Returns the number of hourly and daily rows written.
+    """
+    orders = Order.objects.all()
+    if since is not None:
+        # Start on a local day boundary so no daily row is rebuilt from part of its orders
+        since = timezone.make_aware(datetime.combine(timezone.localtime(since).date(), time.min))
+        orders = orders.filter(ordered_date__gte=since)
+
+    written = []
+    with transaction.atomic():
+        for model, trunc in ((HourlySales, TruncHour), (DailySales, TruncDate)):
+            stale = model.objects.all()
+            if since is not None:
+                stale = stale.filter(period__gte=since if model is HourlySales else since.date())
+            stale.delete()
+            rows = (
+                orders.annotate(period=trunc('ordered_date', tzinfo=timezone.get_current_timezone()))
+                .values('period', 'product__category_id', 'status')
+                .annotate(n=Count('id'), units=Sum('quantity'), revenue=REVENUE)
+                .order_by()
+            )
+            created = model.objects.bulk_create(
+                (
+                    model(period=row['period'], category_id=row['product__category_id'], status=row['status'],
+                          orders=row['n'], units=row['units'], revenue=row['revenue'] or 0)
+                    for row in rows.iterator()
+                ),
+                batch_size=500,
+            )
+            written.append(len(created))
+    return tuple(written)
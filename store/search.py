@@ -0,0 +1,82 @@
+import re
+from dataclasses import dataclass, field
+
+from django.db import connection
+
+from .models import Product
+
+
+SEARCH_RESULTS_PER_PAGE = 12
+# Deeper pages are answered empty; nobody pages that far, and the OFFSET
+# of an arbitrary ?page= could overflow SQLite's 64-bit integers
+SEARCH_MAX_PAGE = 1000
+
+# Column weights for bm25(): title, short_description, detail_description, category_title
+BM25_WEIGHTS = (10.0, 4.0, 1.0, 6.0)
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+SEARCH_SQL = """
+    SELECT f.rowid
+    FROM store_product_fts f
+    INNER JOIN store_product p ON p.id = f.rowid
+    WHERE store_product_fts MATCH %s AND p.is_active
+    ORDER BY bm25(store_product_fts, {weights})
+    LIMIT %s OFFSET %s
+""".format(weights=', '.join(str(w) for w in BM25_WEIGHTS))
+
+
+@dataclass
+class SearchPage:
+    query: str
+    number: int = 1
+    products: list = field(default_factory=list)
+    has_next: bool = False
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+    @property
+    def next_page_number(self):
+        return self.number + 1
+
+    @property
+    def previous_page_number(self):
+        return self.number - 1
+
+
+def build_match_expression(query):
+    """Turn free text into an FTS5 query where every word must match as a prefix.
+
+    Words are quoted so that FTS5 operators typed by the shopper are searched
+    for literally instead of raising a syntax error.
+    """
+    terms = TERM_RE.findall(query.lower())
+    return ' '.join('"{}"*'.format(term) for term in terms)
+
+
+def search_products(query, page=1, per_page=SEARCH_RESULTS_PER_PAGE):
+    """One page of active products matching ``query``, best BM25 rank first."""
+    result = SearchPage(query=query, number=page)
+    match = build_match_expression(query)
+    if not match or page > SEARCH_MAX_PAGE:
+        return result
+
+    offset = (page - 1) * per_page
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            # One extra row tells whether a next page exists without a COUNT(*)
+            cursor.execute(SEARCH_SQL, [match, per_page + 1, offset])
+            ids = [row[0] for row in cursor.fetchall()]
+    else:
+        ids = list(
+            Product.objects.filter(is_active=True, title__icontains=query)
+            .values_list('id', flat=True)[offset:offset + per_page + 1]
+        )
+
+    result.has_next = len(ids) > per_page
+    ids = ids[:per_page]
+    products = Product.objects.in_bulk(ids)
+    result.products = [products[pk] for pk in ids if pk in products]
+    return result
@@ -0,0 +1,192 @@
+"""Synthetic catalog, shopper and order data for load testing.
+
+Rows are generated lazily and written with bulk_create in batches, one
+transaction per batch, so millions of rows never sit in memory and SQLite
+commits in large chunks. bulk_create sends no signals, so the review
+aggregates, sales rollups and page cache are rebuilt once at the end.
+Every row is derived from a seeded random generator, so a given scale and
+seed always produce the same data.
+"""
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import invalidate_pages
+from .models import Address, Cart, Category, Order, Product, ProductReview
+from .ratings import rebuild_ratings
+from .sales import rebuild_sales
+from .sku import assign_skus
+
+
+SCALES = {
+    'small': {'categories': 20, 'products': 2000, 'users': 200, 'carts': 2000, 'orders': 10000, 'reviews': 5000},
+    'medium': {
+        'categories': 200, 'products': 20000, 'users': 2000, 'carts': 50000, 'orders': 200000, 'reviews': 100000,
+    },
+    'large': {
+        'categories': 2000, 'products': 100000, 'users': 10000, 'carts': 1000000, 'orders': 2000000,
+        'reviews': 1000000,
+    },
+}
+# Password of every generated user
+PASSWORD = 'seed-password'
+
+ADJECTIVES = ('Classic', 'Modern', 'Handmade', 'Vintage', 'Golden', 'Silver', 'Woven', 'Carved', 'Painted', 'Mini')
+NOUNS = ('Ring', 'Necklace', 'Basket', 'Bag', 'Mug', 'Canvas', 'Lamp', 'Scarf', 'Bowl', 'Sandals', 'Print', 'Vase')
+CITIES = ('Kampala', 'Entebbe', 'Jinja', 'Mbarara', 'Gulu', 'Mbale')
+STATUS_WEIGHTS = {'Pending': 10, 'Accepted': 8, 'Packed': 7, 'On The Way': 10, 'Delivered': 60, 'Cancelled': 5}
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Let bulk_create keep the given auto_now_add timestamps instead of stamping now()."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add in saved:
+            field.auto_now_add = auto_now_add
+
+
+class Seeder:
+    """Writes ``counts`` rows per model; names start with ``prefix`` so runs can be told apart."""
+
+    def __init__(self, counts, prefix='seed', seed=0, batch_size=5000, days=180, log=None):
+        self.counts = counts
+        self.prefix = prefix
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.days = days
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+
+    def insert(self, model, objects, prepare=None):
+        """bulk_create ``objects`` in transactions of ``batch_size`` rows and log the rate."""
+        started = time.perf_counter()
+        written = 0
+        objects = iter(objects)
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(prepare(batch) if prepare else batch)
+            written += len(batch)
+        elapsed = time.perf_counter() - started
+        self.log('{:<12} {:>9} rows in {:>7.2f}s ({:.0f} rows/s)'.format(
+            model.__name__, written, elapsed, written / elapsed if elapsed else 0))
+        return written
+
+    def moment(self):
+        return self.now - timedelta(seconds=self.rng.randrange(self.days * 86400))
+
+    def categories(self):
+        for n in range(self.counts['categories']):
+            yield Category(
+                title='{} {} {}'.format(self.rng.choice(ADJECTIVES), self.rng.choice(NOUNS), n)[:50],
+                slug='{}-category-{}'.format(self.prefix, n),
+                description='Synthetic category {}'.format(n),
+                is_active=self.rng.random() < 0.95,
+                is_featured=self.rng.random() < 0.1,
+            )
+
+    def products(self, category_ids):
+        for n in range(self.counts['products']):
+            adjective, noun = self.rng.choice(ADJECTIVES), self.rng.choice(NOUNS)
+            yield Product(
+                title='{} {} {}'.format(adjective, noun, n),
+                slug='{}-product-{}'.format(self.prefix, n),
+                short_description='{} {} made for load tests'.format(adjective, noun.lower()),
+                detail_description='Synthetic product {} of the {} data set.'.format(n, self.prefix),
+                price=Decimal(self.rng.randrange(100, 50000)) / 100,
+                # A long tail, like real traffic
+                popularity=min(int(self.rng.paretovariate(1.2) * 10), 10 ** 6),
+                category_id=self.rng.choice(category_ids),
+                is_active=self.rng.random() < 0.97,
+                is_featured=self.rng.random() < 0.05,
+            )
+
+    def users(self):
+        # Hashing once keeps this fast; every user can still log in with PASSWORD
+        password = make_password(PASSWORD)
+        for n in range(self.counts['users']):
+            yield User(
+                username='{}-user-{}'.format(self.prefix, n),
+                email='{}-user-{}@example.com'.format(self.prefix, n),
+                password=password,
+            )
+
+    def addresses(self, user_ids):
+        for user_id in user_ids:
+            yield Address(user_id=user_id, locality='Plot {}'.format(user_id), city=self.rng.choice(CITIES),
+                          state='Central')
+
+    def carts(self, user_ids, product_ids):
+        # Distinct products per user, for the (user, product) unique constraint
+        per_user, extra = divmod(self.counts['carts'], len(user_ids))
+        for i, user_id in enumerate(user_ids):
+            for product_id in self.rng.sample(product_ids, min(per_user + (i < extra), len(product_ids))):
+                yield Cart(user_id=user_id, product_id=product_id, quantity=self.rng.randint(1, 4))
+
+    def orders(self, addresses, products):
+        statuses = list(STATUS_WEIGHTS)
+        weights = [STATUS_WEIGHTS[status] for status in statuses]
+        user_ids = list(addresses)
+        for _ in range(self.counts['orders']):
+            user_id = self.rng.choice(user_ids)
+            product_id, price = self.rng.choice(products)
+            yield Order(
+                user_id=user_id, address_id=addresses[user_id], product_id=product_id,
+                quantity=self.rng.randint(1, 3), unit_price=price, ordered_date=self.moment(),
+                status=self.rng.choices(statuses, weights)[0],
+            )
+
+    def reviews(self, user_ids, product_ids):
+        for _ in range(self.counts['reviews']):
+            yield ProductReview(
+                product_id=self.rng.choice(product_ids), user_id=self.rng.choice(user_ids),
+                rating=self.rng.choices((1, 2, 3, 4, 5), (5, 5, 15, 35, 40))[0],
+                comment='Synthetic review', date_posted=self.moment(),
+            )
+
+    def run(self):
+        prefix = self.prefix
+        self.insert(Category, self.categories())
+        category_ids = list(
+            Category.objects.filter(slug__startswith=prefix + '-category-').order_by('id').values_list('id', flat=True)
+        )
+        self.insert(Product, self.products(category_ids), prepare=assign_skus)
+        products = list(
+            Product.objects.filter(slug__startswith=prefix + '-product-', is_active=True)
+            .order_by('id').values_list('id', 'price')
+        )
+        product_ids = [pk for pk, _ in products]
+
+        self.insert(User, self.users())
+        user_ids = list(
+            User.objects.filter(username__startswith=prefix + '-user-').order_by('id').values_list('id', flat=True)
+        )
+        self.insert(Address, self.addresses(user_ids))
+        addresses = dict(Address.objects.filter(user__username__startswith=prefix + '-user-').values_list('user_id', 'id'))
+
+        self.insert(Cart, self.carts(user_ids, product_ids))
+        with explicit_dates(Order._meta.get_field('ordered_date'), ProductReview._meta.get_field('date_posted')):
+            self.insert(Order, self.orders(addresses, products))
+            self.insert(ProductReview, self.reviews(user_ids, product_ids))
+
+        # Everything the signals would have maintained row by row
+        started = time.perf_counter()
+        rebuild_ratings()
+        rebuild_sales()
+        invalidate_pages('catalog')
+        self.log('aggregates rebuilt in {:.2f}s'.format(time.perf_counter() - started))
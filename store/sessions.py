@@ -0,0 +1,101 @@
+"""Session engine serving sessions from a cache, written through to the database on change.
+
+Based on Django's cached_db engine, with three differences:
+
+* sessions live in their own cache alias (SESSION_CACHE_ALIAS), so page
+  cache churn never evicts them;
+* a save whose data equals what was loaded skips the database write, so
+  re-setting an unchanged value costs nothing;
+* cache entries expire after SESSION_CACHE_TIMEOUT seconds at most. With a
+  process-local cache such as LocMemCache, a session changed by another
+  process (a logout, say) is picked up within that time. Set it to None
+  when the sessions cache is shared.
+
+Expired rows are removed in small batches (see the purge_sessions
+command), so the purge never holds SQLite's write lock for long.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.db import transaction
+from django.utils import timezone
+
+
+KEY_PREFIX = 'store.sessions'
+DEFAULT_CACHE_TIMEOUT = 60
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # Serialized data as loaded, None until loaded
+        self._loaded = None
+
+    def cache_timeout(self, expiry_age):
+        limit = getattr(settings, 'SESSION_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT)
+        return expiry_age if limit is None else min(expiry_age, limit)
+
+    def snapshot(self, data):
+        return self.serializer().dumps(data)
+
+    def load(self):
+        try:
+            data = self._cache.get(self.cache_key)
+        except Exception:
+            # Backends such as memcached raise on invalid keys; start a new session
+            data = None
+
+        if data is None:
+            s = self._get_session_from_db()
+            if s:
+                data = self.decode(s.session_data)
+                self._cache.set(self.cache_key, data, self.cache_timeout(self.get_expiry_age(expiry=s.expire_date)))
+            else:
+                data = {}
+        self._loaded = self.snapshot(data)
+        return data
+
+    def save(self, must_create=False):
+        if (
+            not must_create
+            and self.session_key is not None
+            and self._loaded is not None
+            and not settings.SESSION_SAVE_EVERY_REQUEST
+            and self.snapshot(self._session) == self._loaded
+        ):
+            return
+        super().save(must_create)
+        self._cache.set(self.cache_key, self._session, self.cache_timeout(self.get_expiry_age()))
+        self._loaded = self.snapshot(self._session)
+
+    @classmethod
+    def clear_expired(cls):
+        purge_expired()
+
+
+def purge_expired(batch_size=1000, pause=0.0, now=None):
+    """Delete expired sessions ``batch_size`` rows per transaction and return how many went.
+
+    Each batch is a range scan of the expire_date index followed by a
+    delete by primary key. ``pause`` seconds between batches leave room for
+    other writers such as checkouts.
+    """
+    model = SessionStore.get_model_class()
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            keys = list(
+                model.objects.filter(expire_date__lt=now).order_by('expire_date')
+                .values_list('session_key', flat=True)[:batch_size]
+            )
+            if keys:
+                model.objects.filter(session_key__in=keys).delete()
+        deleted += len(keys)
+        if len(keys) < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,131 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .caching import invalidate_cart_badge, invalidate_cart_badges, invalidate_category_menu, invalidate_pages
+from .images import schedule_derivatives
+from .models import BlogPost, Cart, Category, Order, Product, ProductReview
+from .ratings import apply_rating_changes
+from .related import update_related_index
+from .sales import apply_sales, move_sales, previous_sale, product_sales, sale_of
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    invalidate_category_menu()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def catalog_changed(sender, instance, **kwargs):
+    invalidate_pages('catalog')
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+def blog_changed(sender, instance, **kwargs):
+    invalidate_pages('blog')
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def cart_changed(sender, instance, **kwargs):
+    invalidate_cart_badge(instance.user_id)
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_category(sender, instance, **kwargs):
+    if instance.pk:
+        instance._previous_category_id, instance._previous_price = (
+            Product.objects.filter(pk=instance.pk).values_list('category_id', 'price').first() or (None, None)
+        )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, **kwargs):
+    update_related_index(instance, getattr(instance, '_previous_category_id', None))
+
+
+@receiver(post_save, sender=Product)
+def product_category_changed(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_category_id', None)
+    if not created and previous is not None and previous != instance.category_id:
+        sales = [sale._replace(category_id=previous) for sale in product_sales([instance.pk])]
+        move_sales(sales, instance.category_id)
+
+
+@receiver(post_save, sender=Product)
+def product_price_changed(sender, instance, created, **kwargs):
+    # Cart badges show the subtotal
+    previous = getattr(instance, '_previous_price', None)
+    if not created and previous is not None and previous != instance.price:
+        invalidate_cart_badges([instance.pk])
+
+
+@receiver(pre_save, sender=ProductReview)
+def remember_review_rating(sender, instance, **kwargs):
+    if instance.pk:
+        instance._previous_rating = (
+            ProductReview.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=ProductReview)
+def review_saved(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, '_previous_rating', None)
+    if previous == (instance.product_id, instance.rating):
+        return
+    if previous is None:
+        apply_rating_changes(instance.product_id, added=[instance.rating])
+    elif previous[0] == instance.product_id:
+        apply_rating_changes(instance.product_id, added=[instance.rating], removed=[previous[1]])
+    else:
+        apply_rating_changes(previous[0], removed=[previous[1]])
+        apply_rating_changes(instance.product_id, added=[instance.rating])
+
+
+@receiver(post_delete, sender=ProductReview)
+def review_deleted(sender, instance, **kwargs):
+    apply_rating_changes(instance.product_id, removed=[instance.rating])
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_sale(sender, instance, **kwargs):
+    if instance.pk:
+        instance._previous_sale = previous_sale(instance.pk)
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, **kwargs):
+    # Orders placed at checkout are bulk created and recorded by place_order
+    previous = None if created else getattr(instance, '_previous_sale', None)
+    sale = sale_of(instance)
+    if sale != previous:
+        apply_sales(added=[sale], removed=[previous] if previous else [])
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    # When a category is deleted its rollup rows may be gone before the
+    # cascaded orders are, and recreating them would break the foreign key
+    apply_sales(removed=[sale_of(instance)], create=False)
+
+
+@receiver(post_save, sender=Product)
+def product_image_saved(sender, instance, **kwargs):
+    schedule_derivatives(instance.product_image)
+
+
+@receiver(post_save, sender=Category)
+def category_image_saved(sender, instance, **kwargs):
+    schedule_derivatives(instance.category_image)
+
+
+@receiver(post_save, sender=BlogPost)
+def blog_image_saved(sender, instance, **kwargs):
+    schedule_derivatives(instance.image)
@@ -0,0 +1,105 @@
+import threading
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Product, SkuSequence
+
+
+SKU_SEQUENCE = 'product'
+
+# SKUs reserved per round trip; unused ones are skipped when the process exits
+SKU_BLOCK_SIZE = 50
+
+
+def _highest_numeric_sku():
+    highest = 0
+    for sku in Product.objects.exclude(sku__isnull=True).values_list('sku', flat=True).iterator():
+        if sku.isdigit():
+            highest = max(highest, int(sku))
+    return highest
+
+
+def reserve_skus(count):
+    """Atomically reserve ``count`` consecutive SKU numbers and return the first one.
+
+    The UPDATE takes the row (or, on SQLite, the database) write lock, so
+    concurrent callers always get disjoint ranges.
+    """
+    with transaction.atomic():
+        updated = SkuSequence.objects.filter(name=SKU_SEQUENCE).update(next_value=F('next_value') + count)
+        if not updated:
+            SkuSequence.objects.get_or_create(name=SKU_SEQUENCE, defaults={'next_value': _highest_numeric_sku() + 1})
+            SkuSequence.objects.filter(name=SKU_SEQUENCE).update(next_value=F('next_value') + count)
+        end = SkuSequence.objects.filter(name=SKU_SEQUENCE).values_list('next_value', flat=True).get()
+    return end - count
+
+
+def advance_past(skus):
+    """Move the sequence beyond the numeric ``skus`` that were written explicitly.
+
+    Call it in the transaction that inserts them, so the sequence never
+    hands out one of them. The UPDATE only ever raises next_value.
+    """
+    numbers = [int(sku) for sku in skus if sku and sku.isdigit()]
+    if not numbers:
+        return
+    highest = max(numbers)
+    # Without a sequence row the first reserve_skus() starts past every stored SKU
+    SkuSequence.objects.filter(name=SKU_SEQUENCE, next_value__lte=highest).update(next_value=highest + 1)
+    allocator.skip_through(highest)
+
+
+class SkuAllocator:
+    """Hi/lo allocator: one database round trip per block of SKUs.
+
+    A block is only kept when it was reserved in autocommit mode. Inside
+    an outer transaction the reservation is just a savepoint and may still
+    be rolled back, handing the same numbers out again, so there the
+    allocator reserves the single SKU it needs and keeps nothing.
+    """
+
+    def __init__(self, block_size=SKU_BLOCK_SIZE):
+        self.block_size = block_size
+        self.lock = threading.Lock()
+        self.next_value = 0
+        self.limit = 0
+
+    def next(self):
+        with self.lock:
+            if self.next_value >= self.limit:
+                if transaction.get_connection().in_atomic_block:
+                    return str(reserve_skus(1))
+                self.next_value = reserve_skus(self.block_size)
+                self.limit = self.next_value + self.block_size
+            value = self.next_value
+            self.next_value += 1
+        return str(value)
+
+    def skip_through(self, value):
+        """Drop the reserved block if it reaches ``value``, which is now taken."""
+        with self.lock:
+            if self.next_value <= value:
+                self.limit = self.next_value
+
+    def take(self, count):
+        """``count`` SKUs for bulk inserts, reserved in a single round trip."""
+        if count <= 0:
+            return []
+        start = reserve_skus(count)
+        return [str(value) for value in range(start, start + count)]
+
+
+allocator = SkuAllocator()
+
+
+def next_sku():
+    return allocator.next()
+
+
+def assign_skus(products):
+    """Fill in missing SKUs of unsaved products before ``bulk_create``."""
+    missing = [product for product in products if not product.sku]
+    for product, sku in zip(missing, allocator.take(len(missing))):
+        product.sku = sku
+    return products
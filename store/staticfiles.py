@@ -0,0 +1,188 @@
+"""Hashed, gzip-precompressed static files and a middleware serving them.
+
+collectstatic with CompressedManifestStaticFilesStorage writes every file
+under a content-hashed name (css/site.css -> css/site.3f2a91c0d4e1.css),
+rewrites url() and sourceMappingURL references to the hashed names and
+stores a .gz copy next to each compressible file. StaticFilesMiddleware
+then serves STATIC_ROOT: the .gz copy to clients that accept gzip, and
+hashed names with a one-year immutable Cache-Control, since their
+content can never change under the same URL.
+"""
+import asyncio
+import gzip
+import json
+import mimetypes
+import os
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import http_date
+
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.eot', '.ttf', '.otf',
+}
+# Smaller files gain nothing from gzip once headers are counted
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# Unhashed names may change on the next deploy
+DEFAULT_STATIC_MAX_AGE = 60
+
+
+def compress(path):
+    """Write ``path``.gz if that saves at least 5%; returns whether it was written."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    # mtime=0 keeps the output identical between runs
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) > len(data) * 0.95:
+        return False
+    with open(path + '.gz', 'wb') as f:
+        f.write(compressed)
+    return True
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # A {% static %} reference to a file that was never collected (the
+            # placeholder images, say) 404s as before instead of failing the page
+            return name
+
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+
+        def convert(matchobj):
+            try:
+                return converter(matchobj)
+            except ValueError:
+                # Vendor files point at source maps that are not shipped; keep those references as they are
+                return matchobj.group(0)
+        return convert
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed = []
+        for original, processed, done in super().post_process(paths, dry_run, **options):
+            if processed and not isinstance(done, Exception):
+                hashed.append(processed)
+            yield original, processed, done
+        if dry_run:
+            return
+
+        names = [name for name in set(hashed) if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS]
+        paths = [self.path(name) for name in names if self.size(name) >= MIN_COMPRESS_SIZE]
+        # zlib releases the GIL, so threads compress in parallel
+        with ThreadPoolExecutor() as pool:
+            list(pool.map(compress, paths))
+
+
+class StaticFile:
+    """Headers and file paths of one file under STATIC_ROOT, computed on first request."""
+
+    def __init__(self, name, path, immutable, max_age):
+        stat = os.stat(path)
+        content_type, _ = mimetypes.guess_type(name)
+        self.content_type = content_type or 'application/octet-stream'
+        if immutable:
+            self.cache_control = 'public, max-age={}, immutable'.format(IMMUTABLE_MAX_AGE)
+        else:
+            self.cache_control = 'public, max-age={}'.format(max_age)
+        self.mtime = int(stat.st_mtime)
+        # encoding -> (path, size, ETag)
+        self.variants = {None: (path, stat.st_size, '"{:x}-{:x}"'.format(self.mtime, stat.st_size))}
+        if os.path.isfile(path + '.gz'):
+            size = os.stat(path + '.gz').st_size
+            self.variants['gzip'] = (path + '.gz', size, '"{:x}-{:x}-gz"'.format(self.mtime, size))
+
+
+def accepts_gzip(request):
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip().lower() in ('gzip', '*'):
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+class StaticFilesMiddleware(MiddlewareMixin):
+    """Serve collected static files from STATIC_ROOT; list it right after SecurityMiddleware.
+
+    Requests for files that are not in STATIC_ROOT fall through to the
+    rest of the stack. With DEBUG on the middleware is left out, so
+    runserver serves the source files through the staticfiles finders.
+    Runs in async mode under ASGI.
+    """
+
+    def __init__(self, get_response):
+        if settings.DEBUG or not settings.STATIC_ROOT or not settings.STATIC_URL or '://' in settings.STATIC_URL:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+        self.root = os.path.realpath(settings.STATIC_ROOT)
+        self.max_age = getattr(settings, 'STATIC_MAX_AGE', DEFAULT_STATIC_MAX_AGE)
+        self.files = {}
+        self.hashed_names = self.load_hashed_names()
+
+    def load_hashed_names(self):
+        try:
+            with open(os.path.join(self.root, ManifestStaticFilesStorage.manifest_name)) as f:
+                return set(json.load(f).get('paths', {}).values())
+        except (OSError, ValueError):
+            return set()
+
+    def find(self, name):
+        if name not in self.files:
+            path = os.path.realpath(os.path.join(self.root, *name.split('/')))
+            if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+                return None
+            self.files[name] = StaticFile(name, path, name in self.hashed_names, self.max_age)
+        return self.files[name]
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        response = self.respond(request)
+        return response if response is not None else self.get_response(request)
+
+    async def __acall__(self, request):
+        # After the first request of a file only open() touches the disk
+        response = self.respond(request)
+        return response if response is not None else await self.get_response(request)
+
+    def respond(self, request):
+        """The response for a file under STATIC_ROOT, or None to pass the request on."""
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            name = posixpath.normpath(request.path_info[len(self.prefix):]).lstrip('/')
+            static_file = self.find(name) if name and not name.endswith('.gz') else None
+            if static_file is not None:
+                return self.serve(request, static_file)
+        return None
+
+    def serve(self, request, static_file):
+        encoding = 'gzip' if 'gzip' in static_file.variants and accepts_gzip(request) else None
+        path, size, etag = static_file.variants[encoding]
+        response = get_conditional_response(request, etag=etag, last_modified=static_file.mtime)
+        if response is None:
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type=static_file.content_type)
+            else:
+                response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+                if response.has_header('Content-Disposition'):
+                    # Not a download, and the name would be the .gz one
+                    del response['Content-Disposition']
+            response['Content-Length'] = size
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(static_file.mtime)
+        response['Cache-Control'] = static_file.cache_control
+        if len(static_file.variants) > 1:
+            response['Vary'] = 'Accept-Encoding'
+        return response
@@ -0,0 +1,54 @@
+import hashlib
+from functools import lru_cache
+
+from django import template
+from django.core.cache import cache
+from django.template.engine import Engine
+from django.utils.safestring import mark_safe
+
+from store.caching import PRODUCT_CARD_KEY, PRODUCT_CARD_TIMEOUT
+from store.images import derivatives_ready
+
+
+register = template.Library()
+
+PRODUCT_CARD_TEMPLATE = 'partials/_product_card.html'
+
+
+@lru_cache(maxsize=8)
+def template_version(source):
+    # The cached loader hands out the same source string until the template
+    # is reloaded, so after the first card this is a dict lookup
+    return hashlib.md5(source.encode()).hexdigest()[:8]
+
+
+def get_card_template(engine=None):
+    return (engine or Engine.get_default()).get_template(PRODUCT_CARD_TEMPLATE)
+
+
+def product_card_key(product, card=None):
+    # Ratings are kept up to date with QuerySet.update(), which leaves updated_at
+    # alone, and the image markup changes once its derivatives are written.
+    # The template's own version retires cards rendered by an edited template.
+    card = card or get_card_template()
+    image = product.product_image
+    stamp = '{}:{}:{}:{:.2f}:{:d}'.format(
+        template_version(card.source), product.updated_at.timestamp(), product.rating_count, product.rating_avg,
+        bool(image) and derivatives_ready(image.name),
+    )
+    return PRODUCT_CARD_KEY.format(id=product.id, stamp=stamp)
+
+
+@register.simple_tag(takes_context=True)
+def product_card(context, product):
+    """The listing card of a product, rendered once per product and template version.
+
+    Usage: {% product_card product %}
+    """
+    card = get_card_template(context.template.engine)
+    key = product_card_key(product, card)
+    html = cache.get(key)
+    if html is None:
+        html = card.render(template.Context({'product': product}, autoescape=context.autoescape))
+        cache.set(key, html, PRODUCT_CARD_TIMEOUT)
+    return mark_safe(html)
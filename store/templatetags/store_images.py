@@ -0,0 +1,41 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from store.images import derivative_name, derivatives_ready, get_widths
+
+
+register = template.Library()
+
+
+def _srcset(name, fmt):
+    return format_html_join(
+        ', ', '{} {}w',
+        ((default_storage.url(derivative_name(name, width, fmt)), width) for width in get_widths()),
+    )
+
+
+@register.simple_tag
+def responsive_image(image, alt='', sizes='100vw', css_class='', width=None, lazy=True):
+    """<picture> with WebP and JPEG srcsets of an ImageField, or the original until its derivatives exist.
+
+    Usage: {% responsive_image product.product_image alt=product.title sizes="(min-width: 992px) 25vw, 50vw" css_class="img-fluid w-100" %}
+    """
+    loading = 'lazy' if lazy else 'eager'
+    width_attr = format_html(' width="{}"', width) if width else ''
+    if not derivatives_ready(image.name):
+        return format_html(
+            '<img class="{}" src="{}" alt="{}" loading="{}" decoding="async"{}>',
+            css_class, image.url, alt, loading, width_attr,
+        )
+
+    widths = get_widths()
+    fallback = default_storage.url(derivative_name(image.name, widths[len(widths) // 2], 'jpeg'))
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img class="{}" src="{}" srcset="{}" sizes="{}" alt="{}" loading="{}" decoding="async"{}>'
+        '</picture>',
+        _srcset(image.name, 'webp'), sizes,
+        css_class, fallback, _srcset(image.name, 'jpeg'), sizes, alt, loading, width_attr,
+    )
@@ -1,3 +1,1285 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import re
+import sqlite3
+import tempfile
+from concurrent.futures import Future
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.http import HttpResponse
+from django.template import Template, engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.templatetags.static import static
+from django.test import AsyncRequestFactory, Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.text import slugify
+from PIL import Image
+
+from store import popularity, profiling
+from store.bulk import change_price, move_to_category
+from store.caching import get_cart_badge, get_category_menu, stale_timeout
+from store.backends.sqlite3.base import DatabaseWrapper as SqliteDatabaseWrapper
+from store.cart import SHIPPING_AMOUNT, get_cart_summary, get_cart_totals
+from store.checkout import place_order
+from store.models import (
+    Address, Cart, Category, DailySales, HourlySales, Order, Product, ProductReview, SkuSequence, Wishlist,
+)
+from store.images import derivative_name, derivatives_ready, log_failure, render_derivatives
+from store.pagination import KeysetPaginator, encode_cursor
+from store.related import RELATED_INDEX_KEY, RELATED_PRODUCTS_LIMIT, get_related_products
+from store.sales import rebuild_sales
+from store.search import search_products
+from store.sku import SkuAllocator
+from store.staticfiles import StaticFilesMiddleware
+from store.sessions import SessionStore as CachedSessionStore, purge_expired
+from store.templatetags.store_cards import get_card_template, product_card_key
+
+
+# "SCAN store_product" without an index is a full table scan, while
+# "SCAN store_product USING INDEX ..." walks an index in order. SQLite
+# before 3.36 prints "SCAN TABLE store_product".
+FULL_SCAN_RE = re.compile(r'\bSCAN (?:TABLE )?(?!TABLE )(?P<table>\w+)\b(?! USING)(?! VIRTUAL TABLE)')
+
+
+class QueryPlanTests(TestCase):
+    """Every query issued by the storefront views must be served by an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', password='secret')
+        cls.category = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=True)
+        cls.products = [
+            Product.objects.create(
+                title='Ring {}'.format(i), slug='ring-{}'.format(i), sku='R{}'.format(i),
+                short_description='Gold ring', price=10 + i, popularity=i,
+                category=cls.category, is_active=True, is_featured=i % 2 == 0,
+            )
+            for i in range(15)
+        ]
+        cls.address = Address.objects.create(user=cls.user, locality='Market', city='Kampala', state='Central')
+        for product in cls.products[:3]:
+            Cart.objects.create(user=cls.user, product=product, quantity=2)
+            Order.objects.create(user=cls.user, address=cls.address, product=product, quantity=1)
+            ProductReview.objects.create(product=product, user=cls.user, rating=4, comment='Nice')
+        wishlist = Wishlist.objects.create(user=cls.user)
+        wishlist.products.add(*cls.products[:2])
+
+    def setUp(self):
+        cache.clear()
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexedQueries(self, url, login=False):
+        if login:
+            self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertIn(response.status_code, (200, 302))
+
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            for step in self.explain(sql):
+                match = FULL_SCAN_RE.search(step)
+                if match and match.group('table').startswith('store_'):
+                    self.fail('{} scans {}:\n{}\n{}'.format(url, match.group('table'), sql, step))
+        return response
+
+    def test_home(self):
+        self.assertIndexedQueries(reverse('store:home'))
+        self.assertIndexedQueries(reverse('store:home'), login=True)
+
+    def test_all_categories(self):
+        self.assertIndexedQueries(reverse('store:all-categories'))
+
+    def test_category_products(self):
+        url = reverse('store:category-products', args=[self.category.slug])
+        for sort in ('default', 'popularity', 'rating', 'low-high', 'high-low'):
+            response = self.assertIndexedQueries('{}?sort={}'.format(url, sort))
+            cursor = response.context['page_obj'].next_cursor
+            self.assertIndexedQueries('{}?sort={}&cursor={}'.format(url, sort, cursor))
+
+    def test_detail(self):
+        self.assertIndexedQueries(reverse('store:product-detail', args=[self.products[0].slug]), login=True)
+
+    def test_search(self):
+        self.assertIndexedQueries(reverse('store:search') + '?q=gold')
+
+    def test_search_page_out_of_range(self):
+        # The OFFSET of this page does not fit in a SQLite integer
+        response = self.client.get(reverse('store:search'), {'q': 'gold', 'page': '1' + '0' * 20})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['products'], [])
+
+    def test_cart(self):
+        self.assertIndexedQueries(reverse('store:cart'), login=True)
+
+    def test_checkout(self):
+        self.assertIndexedQueries(reverse('store:checkout'), login=True)
+
+    def test_orders(self):
+        self.assertIndexedQueries(reverse('store:orders'), login=True)
+
+    def test_profile(self):
+        self.assertIndexedQueries(reverse('store:profile'), login=True)
+
+    def test_wishlist(self):
+        self.assertIndexedQueries(reverse('store:view_wishlist'), login=True)
+
+    def test_api(self):
+        self.assertIndexedQueries(reverse('store:api-products') + '?category=rings&sort=popularity')
+        self.assertIndexedQueries(reverse('store:api-products') + '?ids={},{}'.format(self.products[0].id, self.products[1].id))
+        self.assertIndexedQueries(reverse('store:api-categories'))
+
+    def test_add_to_cart(self):
+        self.assertIndexedQueries(reverse('store:add-to-cart') + '?prod_id={}'.format(self.products[5].id), login=True)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.jewellery = Category.objects.create(title='Jewellery', slug='jewellery', is_active=True, is_featured=False)
+        bags = Category.objects.create(title='Bags', slug='bags', is_active=True, is_featured=False)
+
+        def product(title, short_description, category, is_active=True):
+            return Product.objects.create(
+                title=title, slug=slugify(title), sku=slugify(title), short_description=short_description, price=10,
+                category=category, is_active=is_active, is_featured=False,
+            )
+
+        cls.necklace = product('Gold necklace', 'Chain', cls.jewellery)
+        cls.bag = product('Leather bag', 'Gold buckle', bags)
+        cls.hidden = product('Gold ring', 'Retired', cls.jewellery, is_active=False)
+
+    def titles(self, query, **kwargs):
+        return [p.title for p in search_products(query, **kwargs).products]
+
+    def test_ranking_prefixes_and_visibility(self):
+        # A title hit outranks a description hit; inactive products never show
+        self.assertEqual(self.titles('gold'), ['Gold necklace', 'Leather bag'])
+        self.assertEqual(self.titles('neck'), ['Gold necklace'])
+        self.assertEqual(self.titles('jewel'), ['Gold necklace'])
+        self.assertEqual(self.titles('gold chain'), ['Gold necklace'])
+        # FTS5 syntax is searched for literally
+        self.assertEqual(self.titles('gold OR "bag'), [])
+        self.assertEqual(self.titles('***'), [])
+
+    def test_index_follows_writes(self):
+        self.bag.title = 'Canvas tote'
+        self.bag.save()
+        self.assertEqual(self.titles('leather'), [])
+        self.assertEqual(self.titles('tote'), ['Canvas tote'])
+        Category.objects.filter(id=self.jewellery.id).update(title='Accessories')
+        self.assertEqual(self.titles('accessories'), ['Gold necklace'])
+        self.necklace.delete()
+        self.assertEqual(self.titles('gold'), ['Canvas tote'])
+
+    def test_pages(self):
+        first = search_products('gold', per_page=1)
+        self.assertEqual(([p.title for p in first.products], first.has_next), (['Gold necklace'], True))
+        second = search_products('gold', page=2, per_page=1)
+        self.assertEqual(([p.title for p in second.products], second.has_next), (['Leather bag'], False))
+        response = self.client.get(reverse('store:search'), {'q': 'gold', 'page': 'x'})
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertContains(response, 'Gold necklace')
+
+
+class CartSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', password='secret')
+        cls.other = User.objects.create_user('other', password='secret')
+        category = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=False)
+        cls.ring, cls.bag = [
+            Product.objects.create(
+                title=title, slug=title.lower(), sku=title, price=price, category=category, is_active=True, is_featured=False,
+            )
+            for title, price in (('Ring', Decimal('10.25')), ('Bag', Decimal('3.10')))
+        ]
+        Cart.objects.create(user=cls.user, product=cls.ring, quantity=2)
+        Cart.objects.create(user=cls.user, product=cls.bag, quantity=3)
+        Cart.objects.create(user=cls.other, product=cls.ring, quantity=7)
+
+    def test_summary_of_one_user(self):
+        summary = get_cart_summary(self.user)
+        # Oldest line first, each with its total from the database
+        self.assertEqual([(line.product.title, line.line_total) for line in summary.lines],
+                         [('Ring', Decimal('20.50')), ('Bag', Decimal('9.30'))])
+        self.assertEqual((summary.subtotal, summary.item_count, summary.line_count), (Decimal('29.80'), 5, 2))
+        self.assertEqual(summary.total_amount, Decimal('29.80') + SHIPPING_AMOUNT)
+
+        totals = get_cart_totals(self.user)
+        self.assertEqual((totals.subtotal, totals.item_count, totals.line_count), (Decimal('29.80'), 5, 2))
+        newcomer = User.objects.create_user('new')
+        empty = get_cart_totals(newcomer)
+        self.assertEqual((empty.subtotal, empty.line_count, bool(get_cart_summary(newcomer))), (Decimal('0'), 0, False))
+
+    def test_cart_page(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('store:cart'))
+        self.assertEqual(len(response.context['cart_products']), 2)
+        self.assertEqual(response.context['amount'], Decimal('29.80'))
+        self.assertEqual(response.context['total_amount'], Decimal('29.80') + SHIPPING_AMOUNT)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=False)
+        # Two products share a popularity, so the id breaks the tie
+        cls.products = [
+            Product.objects.create(
+                title='Ring {}'.format(i), slug='ring-{}'.format(i), sku='R{}'.format(i), price=10 + i,
+                popularity=popularity, category=category, is_active=True, is_featured=False,
+            )
+            for i, popularity in enumerate((5, 9, 9, 1, 7))
+        ]
+
+    def page(self, token=None, sort='popularity'):
+        return KeysetPaginator(Product.objects.all(), sort, per_page=2).get_page(token)
+
+    def titles(self, page):
+        return [p.title for p in page]
+
+    def test_walks_forward_and_back(self):
+        first = self.page()
+        self.assertEqual(self.titles(first), ['Ring 2', 'Ring 1'])
+        self.assertEqual((first.has_next, first.has_previous), (True, False))
+        second = self.page(first.next_cursor)
+        self.assertEqual(self.titles(second), ['Ring 4', 'Ring 0'])
+        last = self.page(second.next_cursor)
+        self.assertEqual(self.titles(last), ['Ring 3'])
+        self.assertEqual((last.has_next, last.has_previous), (False, True))
+        self.assertEqual(self.titles(self.page(last.previous_cursor)), ['Ring 4', 'Ring 0'])
+        back = self.page(second.previous_cursor)
+        self.assertEqual(self.titles(back), ['Ring 2', 'Ring 1'])
+        self.assertFalse(back.has_previous)
+
+    def test_cursor_from_another_sort(self):
+        # A created_at cursor can't be read as a price, so the price sort starts over
+        second = self.page(self.page(sort='default').next_cursor, sort='low-high')
+        self.assertEqual(self.titles(second), ['Ring 0', 'Ring 1'])
+        # Nor is a price a popularity
+        price_cursor = self.page(sort='low-high').next_cursor
+        self.assertEqual(self.titles(self.page(price_cursor)), ['Ring 2', 'Ring 1'])
+
+    def test_bad_cursors_are_the_first_page(self):
+        ring = self.products[0]
+        for token in (
+            'not base64!', 'bm90IGpzb24', encode_cursor('sideways', '5', ring.id),
+            encode_cursor('next', None, ring.id), encode_cursor('next', [1], ring.id), encode_cursor('next', 5, ring.id),
+            encode_cursor('next', '5', None), encode_cursor('next', '5', '1'), encode_cursor('next', '5', 10 ** 30),
+            encode_cursor('next', '1e400', ring.id), encode_cursor('next', str(10 ** 30), ring.id),
+            encode_cursor('next', 'NaN', ring.id),
+            # {"d":"next","v":"5","id":1e400}
+            'eyJkIjoibmV4dCIsInYiOiI1IiwiaWQiOjFlNDAwfQ',
+        ):
+            with self.subTest(token=token):
+                page = self.page(token)
+                self.assertEqual(self.titles(page), ['Ring 2', 'Ring 1'])
+                self.assertFalse(page.has_previous)
+        for sort in ('default', 'rating', 'low-high'):
+            with self.subTest(sort=sort):
+                self.assertEqual(len(self.page(encode_cursor('next', [1], ring.id), sort=sort)), 2)
+                self.assertEqual(len(self.page(encode_cursor('next', '1e400', ring.id), sort=sort)), 2)
+
+    def test_listing_and_api_ignore_bad_cursors(self):
+        token = encode_cursor('next', str(10 ** 30), self.products[0].id)
+        response = self.client.get(reverse('store:api-products'), {'sort': 'popularity', 'cursor': token})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('store:category-products', args=['rings']), {'sort': 'popularity', 'cursor': token})
+        self.assertEqual(len(response.context['products']), 5)
+
+
+class NavbarCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', password='secret')
+        cls.rings = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=False)
+        cls.ring = Product.objects.create(
+            title='Ring', slug='ring', sku='R1', price=Decimal('10.00'), category=cls.rings, is_active=True, is_featured=False,
+        )
+        Cart.objects.create(user=cls.user, product=cls.ring, quantity=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_category_menu(self):
+        self.assertEqual([c['slug'] for c in get_category_menu()], ['rings'])
+        with self.assertNumQueries(0):
+            get_category_menu()
+        Category.objects.create(title='Bags', slug='bags', is_active=True, is_featured=False)
+        Category.objects.create(title='Hidden', slug='hidden', is_active=False, is_featured=False)
+        self.assertEqual(sorted(c['slug'] for c in get_category_menu()), ['bags', 'rings'])
+
+    def test_cart_badge(self):
+        self.assertEqual(get_cart_badge(self.user.id), {'count': 1, 'total': Decimal('20.00')})
+        with self.assertNumQueries(0):
+            get_cart_badge(self.user.id)
+
+        self.ring.price = Decimal('12.00')
+        self.ring.save()
+        self.assertEqual(get_cart_badge(self.user.id)['total'], Decimal('24.00'))
+        change_price(Product.objects.filter(id=self.ring.id), 50)
+        self.assertEqual(get_cart_badge(self.user.id)['total'], Decimal('36.00'))
+        Cart.objects.filter(user=self.user).delete()
+        self.assertEqual(get_cart_badge(self.user.id), {'count': 0, 'total': Decimal('0.00')})
+
+    def test_cart_badge_view(self):
+        url = reverse('store:cart-badge')
+        self.assertEqual(json.loads(self.client.get(url).content), {'count': 0, 'total': '0.00'})
+        self.client.force_login(self.user)
+        self.assertEqual(json.loads(self.client.get(url).content), {'count': 1, 'total': '20.00'})
+
+    def test_stale_timeout(self):
+        self.assertEqual(stale_timeout(3600), 60)
+        with self.settings(CACHE_STALE_TIMEOUT=None):
+            self.assertEqual(stale_timeout(3600), 3600)
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', password='secret')
+        cls.rings = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=True)
+        cls.ring = Product.objects.create(
+            title='Gold ring', slug='gold-ring', sku='R1', price=10, category=cls.rings, is_active=True, is_featured=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_pages_are_cached_and_vary_on_cookie(self):
+        url = reverse('store:category-products', args=['rings'])
+        self.assertEqual(self.client.get(url)['Vary'], 'Cookie')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['Vary'], 'Cookie')
+        self.assertContains(response, 'Gold ring')
+
+        self.client.force_login(self.user)
+        self.assertIn('Cookie', self.client.get(url)['Vary'])
+        # Entries expire with CACHE_STALE_TIMEOUT, zero stores nothing
+        cache.clear()
+        with self.settings(CACHE_STALE_TIMEOUT=0):
+            Client().get(url)
+            with CaptureQueriesContext(connection) as ctx:
+                Client().get(url)
+        self.assertTrue(ctx.captured_queries)
+
+    def test_cached_pages_carry_the_visitors_csrf_token(self):
+        Client().get(reverse('store:home'))
+        visitor = Client(enforce_csrf_checks=True)
+        content = visitor.get(reverse('store:home')).content.decode()
+        self.assertNotIn('__store_csrf_token__', content)
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', content).group(1)
+        response = visitor.post(reverse('store:subscribe'), {'email': 'visitor@example.com', 'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 302)
+
+    def test_product_and_category_saves_invalidate(self):
+        url = reverse('store:category-products', args=['rings'])
+        self.client.get(url)
+        self.ring.title = 'Silver ring'
+        self.ring.save()
+        self.assertContains(self.client.get(url), 'Silver ring')
+        self.rings.title = 'Bands'
+        self.rings.save()
+        self.assertContains(self.client.get(url), 'Bands')
+
+
+class RelatedProductsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rings = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=False)
+        cls.bags = Category.objects.create(title='Bags', slug='bags', is_active=True, is_featured=False)
+        cls.products = [
+            Product.objects.create(
+                title='Ring {}'.format(i), slug='ring-{}'.format(i), sku='R{}'.format(i), price=10, popularity=i,
+                category=cls.rings, is_active=i != 3, is_featured=False,
+            )
+            for i in range(RELATED_PRODUCTS_LIMIT + 3)
+        ]
+        Product.objects.create(
+            title='Bag', slug='bag', sku='B1', price=10, popularity=1000, category=cls.bags, is_active=True, is_featured=False,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def related(self, product):
+        return [p.title for p in get_related_products(product)]
+
+    def test_ranked_active_products_of_the_category(self):
+        top = self.products[-1]
+        expected = ['Ring {}'.format(i) for i in range(RELATED_PRODUCTS_LIMIT + 1, -1, -1) if i != 3]
+        self.assertEqual(self.related(top), expected[:RELATED_PRODUCTS_LIMIT])
+        self.assertEqual(self.related(self.products[0])[0], top.title)
+        # Only ids and ranks are cached
+        cached = cache.get(RELATED_INDEX_KEY.format(category_id=self.rings.id))
+        self.assertEqual(cached[0], (top.popularity, top.created_at, top.id))
+
+    def test_refreshed_by_saves(self):
+        first, top = self.products[0], self.products[-1]
+        self.related(top)
+        first.popularity = 500
+        first.save()
+        self.assertEqual(self.related(top)[0], 'Ring 0')
+
+        first.is_active = False
+        first.save()
+        self.assertNotIn('Ring 0', self.related(top))
+
+        top.category = self.bags
+        top.save()
+        self.assertEqual(self.related(top), ['Bag'])
+        self.assertNotIn(top.title, self.related(self.products[1]))
+
+    def test_rows_deactivated_behind_the_cache_are_dropped(self):
+        top = self.products[-1]
+        self.related(top)
+        Product.objects.filter(id=self.products[-2].id).update(is_active=False)
+        self.assertNotIn(self.products[-2].title, self.related(top))
+
+
+class AddToCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', password='secret')
+        category = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=False)
+        cls.product = Product.objects.create(
+            title='Ring', slug='ring', sku='R1', price=Decimal('10.00'), category=category, is_active=True, is_featured=False,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeated_adds_increment_one_line(self):
+        self.client.force_login(self.user)
+        url = reverse('store:add-to-cart') + '?prod_id={}'.format(self.product.id)
+        self.client.get(url)
+        self.assertEqual(get_cart_badge(self.user.id)['count'], 1)
+        self.client.get(url)
+        self.assertEqual(list(Cart.objects.filter(user=self.user).values_list('quantity', flat=True)), [2])
+        # The badge, cached by the first add, shows the new subtotal
+        self.assertEqual(get_cart_badge(self.user.id)['total'], Decimal('20.00'))
+
+
+class PopularityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', password='secret')
+        category = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=False)
+        cls.ring = Product.objects.create(
+            title='Ring', slug='ring', sku='R1', short_description='Gold', price=10,
+            category=category, is_active=True, is_featured=False,
+        )
+
+    def setUp(self):
+        cache.clear()
+        with popularity.counter.lock:
+            popularity.counter.pending.clear()
+
+    def popularity(self):
+        return Product.objects.values_list('popularity', flat=True).get(id=self.ring.id)
+
+    def test_buffered_until_flushed(self):
+        counter = popularity.PopularityCounter(flush_interval=3600)
+        counter.record(self.ring.id, 'detail_view')
+        counter.record(self.ring.id, 'add_to_cart', times=2)
+        self.assertEqual(self.popularity(), 0)
+        self.assertEqual(counter.flush(), 1)
+        self.assertEqual(self.popularity(), 7)
+        self.assertEqual(counter.flush(), 0)
+
+    def test_failed_flush_keeps_the_increments(self):
+        counter = popularity.PopularityCounter(flush_interval=3600)
+        counter.record(self.ring.id, 'wishlist')
+        counter.record('not an id', 'wishlist')
+        with self.assertRaises(ValueError):
+            counter.flush()
+        self.assertEqual(self.popularity(), 0)
+        self.assertEqual(dict(counter.pending), {self.ring.id: 5, 'not an id': 5})
+
+    def test_cached_detail_pages_are_counted(self):
+        url = reverse('store:product-detail', args=['ring'])
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        self.client.force_login(self.user)
+        self.client.get(url)
+        popularity.counter.flush()
+        self.assertEqual(self.popularity(), 4)
+
+    def test_rebuild_command(self):
+        Wishlist.objects.create(user=self.user).products.add(self.ring)
+        Product.objects.filter(id=self.ring.id).update(popularity=100)
+        out = StringIO()
+        call_command('popularity', stdout=out)
+        self.assertIn('Rebuilt popularity of 1 products.', out.getvalue())
+        self.assertEqual(self.popularity(), 5)
+
+
+class RatingAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user('reviewer{}'.format(i)) for i in range(3)]
+        category = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=True)
+        cls.ring, cls.necklace = [
+            Product.objects.create(
+                title=title, slug=title.lower(), sku=title, short_description='Gold', price=10,
+                category=category, is_active=True, is_featured=False,
+            )
+            for title in ('Ring', 'Necklace')
+        ]
+
+    def assertRatings(self, product, average, count, histogram):
+        product.refresh_from_db()
+        self.assertEqual((product.rating_avg, product.rating_count), (Decimal(average), count))
+        self.assertEqual([product.stars_1, product.stars_2, product.stars_3, product.stars_4, product.stars_5], histogram)
+
+    def test_create_edit_delete(self):
+        first = ProductReview.objects.create(product=self.ring, user=self.users[0], rating=5, comment='Great')
+        ProductReview.objects.create(product=self.ring, user=self.users[1], rating=4, comment='Good')
+        ProductReview.objects.create(product=self.ring, user=self.users[2], rating=4, comment='Fine')
+        self.assertRatings(self.ring, '4.33', 3, [0, 0, 0, 2, 1])
+
+        first.rating = 1
+        first.save()
+        self.assertRatings(self.ring, '3.00', 3, [1, 0, 0, 2, 0])
+
+        first.product = self.necklace
+        first.save()
+        self.assertRatings(self.ring, '4.00', 2, [0, 0, 0, 2, 0])
+        self.assertRatings(self.necklace, '1.00', 1, [1, 0, 0, 0, 0])
+
+        first.delete()
+        self.assertRatings(self.necklace, '0.00', 0, [0, 0, 0, 0, 0])
+
+    def test_rebuild_matches_incremental(self):
+        for user, rating in zip(self.users, (5, 2, 4)):
+            ProductReview.objects.create(product=self.ring, user=user, rating=rating, comment='Ok')
+        Product.objects.filter(id=self.ring.id).update(rating_avg=0, rating_count=0, stars_5=0)
+        call_command('ratings', stdout=StringIO())
+        self.assertRatings(self.ring, '3.67', 3, [0, 1, 0, 1, 1])
+        self.assertRatings(self.necklace, '0.00', 0, [0, 0, 0, 0, 0])
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', password='secret', is_staff=True)
+        cls.address = Address.objects.create(user=cls.user, locality='Market', city='Kampala', state='Central')
+        cls.rings = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=False)
+        cls.bags = Category.objects.create(title='Bags', slug='bags', is_active=True, is_featured=False)
+        cls.ring = Product.objects.create(
+            title='Ring', slug='ring', sku='R1', short_description='Gold', price=10,
+            category=cls.rings, is_active=True, is_featured=False,
+        )
+        cls.bag = Product.objects.create(
+            title='Bag', slug='bag', sku='B1', short_description='Leather', price=25,
+            category=cls.bags, is_active=True, is_featured=False,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def rollups(self, model):
+        return sorted(model.objects.values_list('category__slug', 'status', 'orders', 'units', 'revenue'))
+
+    def test_checkout_status_change_and_delete(self):
+        Cart.objects.create(user=self.user, product=self.ring, quantity=2)
+        Cart.objects.create(user=self.user, product=self.bag, quantity=1)
+        self.assertEqual(get_cart_badge(self.user.id)['count'], 2)
+        orders = place_order(self.user, self.address)
+        self.assertEqual(get_cart_badge(self.user.id)['count'], 0)
+        expected = [('bags', 'Pending', 1, 1, Decimal('25')), ('rings', 'Pending', 1, 2, Decimal('20'))]
+        self.assertEqual(self.rollups(DailySales), expected)
+        self.assertEqual(self.rollups(HourlySales), expected)
+
+        # Later price changes do not rewrite history
+        Product.objects.filter(id=self.ring.id).update(price=99)
+        ring_order = Order.objects.get(product=self.ring)
+        ring_order.status = 'Delivered'
+        ring_order.save()
+        self.assertEqual(self.rollups(DailySales), [
+            ('bags', 'Pending', 1, 1, Decimal('25')),
+            ('rings', 'Delivered', 1, 2, Decimal('20')),
+            ('rings', 'Pending', 0, 0, Decimal('0')),
+        ])
+
+        Order.objects.filter(id__in=[order.id for order in orders]).delete()
+        self.assertEqual({row[2:] for row in self.rollups(DailySales)}, {(0, 0, Decimal('0'))})
+
+    def test_rebuild_matches_incremental(self):
+        for product, quantity in ((self.ring, 3), (self.bag, 2), (self.ring, 1)):
+            Order.objects.create(user=self.user, address=self.address, product=product, quantity=quantity)
+        Order.objects.filter(product=self.bag).update(status='Cancelled')  # bypasses the signals
+        call_command('sales_rollups', stdout=StringIO())
+        self.assertEqual(self.rollups(DailySales), [
+            ('bags', 'Cancelled', 1, 2, Decimal('50')),
+            ('rings', 'Pending', 2, 4, Decimal('40')),
+        ])
+        self.assertEqual(self.rollups(HourlySales), self.rollups(DailySales))
+
+    def test_deleting_a_category_with_orders(self):
+        Order.objects.create(user=self.user, address=self.address, product=self.ring, quantity=3)
+        Order.objects.create(user=self.user, address=self.address, product=self.bag, quantity=1)
+        self.rings.delete()
+        connection.check_constraints()
+        self.assertEqual(self.rollups(DailySales), [('bags', 'Pending', 1, 1, Decimal('25'))])
+        self.assertEqual(self.rollups(HourlySales), self.rollups(DailySales))
+
+    def test_moved_products_take_their_sales_along(self):
+        for product, quantity in ((self.ring, 3), (self.bag, 2), (self.ring, 1)):
+            Order.objects.create(user=self.user, address=self.address, product=product, quantity=quantity)
+        self.ring.category = self.bags
+        self.ring.save()
+        self.assertEqual([row for row in self.rollups(DailySales) if row[2]], [('bags', 'Pending', 3, 6, Decimal('90'))])
+
+        move_to_category(Product.objects.filter(id__in=[self.ring.id, self.bag.id]), self.rings)
+        incremental = [row for row in self.rollups(DailySales) if row[2]]
+        self.assertEqual(incremental, [('rings', 'Pending', 3, 6, Decimal('90'))])
+        rebuild_sales()
+        self.assertEqual(self.rollups(DailySales), incremental)
+
+    def test_dashboard_reads_rollups_only(self):
+        Order.objects.create(user=self.user, address=self.address, product=self.ring, quantity=3)
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('custom_admin:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['revenue_total'], Decimal('30'))
+        self.assertFalse([query['sql'] for query in ctx.captured_queries if 'store_order' in query['sql']])
+
+
+class CatalogImportExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rings = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=False)
+        cls.bags = Category.objects.create(title='Bags', slug='bags', is_active=True, is_featured=False)
+        Product.objects.create(
+            title='Old ring', slug='old-ring', sku='RING-1', short_description='Gold', price=10,
+            category=cls.rings, is_active=True, is_featured=False,
+        )
+
+    def import_file(self, content, suffix, *args):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.remove, f.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_products', f.name, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_upsert_and_errors(self):
+        rows = ['sku,title,category,price,short_description,is_active,is_featured', 'RING-1,New ring,rings,12.5,Gold,true,yes']
+        rows += ['BAG-{0},Bag {0},bags,{0},Leather,1,0'.format(i) for i in range(7)]
+        rows += [',Unnamed SKU,bags,3,Cloth,1,0', 'BAD-1,Bad,shoes,1,x,1,0', 'BAD-2,Bad,bags,abc,x,1,0']
+        with CaptureQueriesContext(connection) as ctx:
+            out, err = self.import_file('\n'.join(rows) + '\n', '.csv', '--batch-size', '4')
+        self.assertIn('11 rows', out)
+        self.assertIn('8 created, 1 updated, 2 skipped', out)
+        self.assertIn("line 11: unknown category 'shoes'", err)
+        self.assertIn('line 12: price must be a number', err)
+        # Three batches of at most one lookup, INSERT and UPDATE, never a query per row
+        writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE "store_product"'))]
+        self.assertLessEqual(len(writes), 6)
+
+        ring = Product.objects.get(sku='RING-1')
+        self.assertEqual((ring.title, ring.price, ring.is_featured, ring.slug), ('New ring', Decimal('12.50'), True, 'old-ring'))
+        self.assertEqual(Product.objects.filter(category=self.bags).count(), 8)
+        self.assertTrue(Product.objects.get(title='Unnamed SKU').sku)
+
+    def test_ambiguous_categories_and_long_values_are_row_errors(self):
+        Category.objects.create(title='Bracelets', slug='bracelets', is_active=True, is_featured=False)
+        Category.objects.create(title='Old bracelets', slug='bracelets', is_active=False, is_featured=False)
+        row = {'title': 'Bangle', 'category': 'rings', 'price': 5, 'short_description': 'Gold'}
+        rows = [
+            {**row, 'sku': 'OK-1'},
+            {**row, 'sku': 'BAD-1', 'category': 'bracelets'},
+            {**row, 'sku': 'S' * 256},
+            {**row, 'sku': 'BAD-3', 'slug': 'b' * 161},
+            {**row, 'sku': 'BAD-4', 'title': 'T' * 151},
+            {**row, 'sku': 'OK-2', 'slug': 'b' * 160},
+        ]
+        out, err = self.import_file(''.join(json.dumps(r) + '\n' for r in rows), '.jsonl')
+        self.assertIn('2 created, 0 updated, 4 skipped', out)
+        self.assertIn("line 2: category 'bracelets' is ambiguous", err)
+        self.assertIn('line 3: sku is too long (at most 255 characters)', err)
+        self.assertIn('line 4: slug is too long (at most 160 characters)', err)
+        self.assertIn('line 5: title is too long (at most 150 characters)', err)
+        self.assertEqual(sorted(Product.objects.filter(sku__startswith='OK').values_list('sku', flat=True)), ['OK-1', 'OK-2'])
+
+    def test_numeric_skus_advance_the_sequence(self):
+        first = Product.objects.create(
+            title='Generated', slug='generated', short_description='Gold', price=10,
+            category=self.rings, is_active=True, is_featured=False,
+        )
+        start = int(first.sku)
+        rows = ['sku,title,category,price,short_description']
+        rows += ['{0},Ring {0},rings,5,Gold'.format(sku) for sku in range(start + 1, start + 6)]
+        self.import_file('\n'.join(rows) + '\n', '.csv')
+        self.assertGreater(SkuSequence.objects.get(name='product').next_value, start + 5)
+        # Neither the rest of this process' reserved block nor the sequence reuses an imported SKU
+        after = Product.objects.create(
+            title='Generated later', slug='generated-later', short_description='Gold', price=10,
+            category=self.rings, is_active=True, is_featured=False,
+        )
+        self.assertGreater(int(after.sku), start + 5)
+
+    def test_export_round_trip(self):
+        Product.objects.create(
+            title='Bag', slug='bag', sku='BAG-1', short_description='Leather', price=30,
+            category=self.bags, is_active=False, is_featured=True,
+        )
+        for fmt in ('csv', 'jsonl'):
+            with self.subTest(fmt=fmt):
+                with tempfile.NamedTemporaryFile(suffix='.' + fmt, delete=False) as f:
+                    path = f.name
+                self.addCleanup(os.remove, path)
+                call_command('export_products', '-o', path, '--chunk-size', '1', stderr=StringIO())
+                with open(path) as f:
+                    content = f.read()
+                if fmt == 'jsonl':
+                    self.assertEqual(json.loads(content.splitlines()[1])['category'], 'bags')
+                out, _ = self.import_file(content, '.' + fmt)
+                self.assertIn('0 created, 2 updated, 0 skipped', out)
+        self.assertEqual(Product.objects.count(), 2)
+
+
+class SkuAllocatorTests(TransactionTestCase):
+    """TransactionTestCase, since blocks are only kept outside transactions."""
+
+    def sequence(self):
+        return SkuSequence.objects.get(name='product').next_value
+
+    def test_blocks_outside_transactions(self):
+        allocator = SkuAllocator(block_size=10)
+        first = int(allocator.next())
+        with self.assertNumQueries(0):
+            rest = [int(allocator.next()) for _ in range(9)]
+        self.assertEqual(rest, list(range(first + 1, first + 10)))
+        self.assertEqual(self.sequence(), first + 10)
+        self.assertEqual(int(SkuAllocator(block_size=10).next()), first + 10)
+
+    def test_rolled_back_reservations_are_not_reused(self):
+        SkuSequence.objects.create(name='product', next_value=100)
+        allocator, other = SkuAllocator(block_size=10), SkuAllocator(block_size=10)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.assertEqual([allocator.next(), allocator.next()], ['100', '101'])
+            raise RuntimeError
+        # The numbers went back to the sequence, and only there
+        self.assertEqual(self.sequence(), 100)
+        mine = {allocator.next() for _ in range(5)}
+        theirs = {other.next() for _ in range(5)}
+        self.assertFalse(mine & theirs)
+
+
+class CatalogApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=True)
+        cls.products = [
+            Product.objects.create(
+                title='Ring {}'.format(i), slug='ring-{}'.format(i), sku='R{}'.format(i), short_description='Gold ring',
+                price=10 + i, category=cls.category, is_active=True, is_featured=False,
+            )
+            for i in range(3)
+        ]
+
+    def test_batched_ids_with_sparse_fields(self):
+        first, _, last = self.products
+        url = '{}?ids={},999,{}&fields=title,price'.format(reverse('store:api-products'), last.id, first.id)
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.json(), {'results': [
+            {'title': 'Ring 2', 'price': '12.00'},
+            {'title': 'Ring 0', 'price': '10.00'},
+        ]})
+
+    def test_etag_revalidation(self):
+        url = reverse('store:api-product', args=[self.products[0].id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.products[0].title = 'Silver ring'
+        self.products[0].save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], 'Silver ring')
+
+    def test_invalid_parameters(self):
+        url = reverse('store:api-products')
+        for query in ('fields=title,secret', 'ids=1,x', 'sort=random', 'ids=1,{}'.format(2 ** 63), 'ids=0', 'ids=-1'):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get('{}?{}'.format(url, query)).status_code, 400)
+        self.assertEqual(self.client.get(reverse('store:api-categories'), {'ids': 10 ** 30}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('store:api-products'), {'ids': 2 ** 63 - 1}).json(), {'results': []})
+        self.assertEqual(self.client.get(reverse('store:api-category', args=[999])).status_code, 404)
+        for name in ('store:api-product', 'store:api-category'):
+            for pk in (2 ** 63 - 1, 2 ** 63, 10 ** 30):
+                with self.subTest(name=name, pk=pk):
+                    self.assertEqual(self.client.get(reverse(name, args=[pk])).status_code, 404)
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=True)
+        cls.products = [
+            Product.objects.create(
+                title='Ring {}'.format(i), slug='ring-{}'.format(i), sku='R{}'.format(i), short_description='Gold',
+                price=10, category=category, is_active=True, is_featured=True,
+            )
+            for i in range(4)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        profiling.stats.reset()
+
+    def profile(self, view, path='/'):
+        request = RequestFactory().get(path)
+        request.resolver_match = resolve('/')
+        return profiling.ProfilingMiddleware(view)(request)
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            profiling.fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            'SELECT * FROM t WHERE id IN (%s...) AND name = ? LIMIT ?',
+        )
+        self.assertEqual(profiling.fingerprint('id IN (%s, %s)'), profiling.fingerprint('id IN (%s, %s, %s, %s)'))
+
+    def test_n_plus_one(self):
+        def view(request):
+            # One query per product, the pattern the report is meant to surface
+            for product in self.products:
+                Product.objects.filter(id=product.id).first()
+            Category.objects.count()
+            return HttpResponse()
+
+        self.profile(view)
+        self.profile(view)
+        row, = profiling.stats.report()
+        self.assertEqual((row['view'], row['requests'], row['queries_max']), ('store:home', 2, 5))
+        duplicate, = row['duplicates']
+        self.assertIn('FROM "store_product"', duplicate['sql'])
+        self.assertEqual((duplicate['requests'], duplicate['max']), (2, 4))
+        self.assertGreater(row['wall_p95'], 0)
+
+    def test_queries_on_other_threads(self):
+        def view(request):
+            async_to_sync(sync_to_async(lambda: connection.cursor().execute('SELECT 1'), thread_sensitive=False))()
+            return HttpResponse()
+
+        self.profile(view)
+        self.assertEqual(profiling.stats.report()[0]['queries_max'], 1)
+
+    def test_async_requests(self):
+        async def view(request):
+            await sync_to_async(lambda: connection.cursor().execute('SELECT 1'), thread_sensitive=False)()
+            return HttpResponse()
+
+        middleware = profiling.ProfilingMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        request = AsyncRequestFactory().get('/')
+        request.resolver_match = resolve('/')
+        self.assertEqual(async_to_sync(middleware)(request).status_code, 200)
+        row, = profiling.stats.report()
+        self.assertEqual((row['view'], row['requests'], row['queries_max']), ('store:home', 1, 1))
+
+    def test_slow_log(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'slow.jsonl')
+            with self.settings(PROFILING_SLOW_LOG=path, PROFILING_SLOW_MS=0, PROFILING_SAMPLE_RATE=1):
+                self.profile(lambda request: HttpResponse(Product.objects.count()), '/?page=2')
+            with self.settings(PROFILING_SLOW_LOG=path, PROFILING_SLOW_MS=10 ** 6):
+                self.profile(lambda request: HttpResponse())
+            with open(path) as log:
+                entries = [json.loads(line) for line in log]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual((entries[0]['path'], entries[0]['view'], entries[0]['queries']), ('/?page=2', 'store:home', 1))
+
+    def test_client_requests_are_recorded(self):
+        self.client.get(reverse('store:home'))
+        self.client.get('/no/such/page/')
+        views = {row['view'] for row in profiling.stats.report()}
+        self.assertIn('store:home', views)
+
+
+class SeedAndBenchmarkTests(TestCase):
+    def test_seed_then_benchmark(self):
+        counts = {'categories': 3, 'products': 30, 'users': 4, 'carts': 10, 'orders': 40, 'reviews': 25}
+        args = ['--{}={}'.format(model, n) for model, n in counts.items()]
+        call_command('seed_data', *args, '--batch-size=7', stdout=StringIO())
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual((Product.objects.count(), Cart.objects.count(), Order.objects.count()), (30, 10, 40))
+        # Aggregates that bulk_create bypassed were rebuilt
+        self.assertEqual(sum(Product.objects.values_list('rating_count', flat=True)), 25)
+        self.assertEqual(sum(DailySales.objects.values_list('orders', flat=True)), 40)
+        self.assertGreater(Order.objects.dates('ordered_date', 'day').count(), 1)
+        with self.assertRaises(CommandError):
+            call_command('seed_data', *args, stdout=StringIO())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.json')
+            call_command('benchmark_views', '--requests=3', '--warmup=1', '--no-page-cache', '-o', path, stdout=StringIO())
+            with open(path) as f:
+                report = json.load(f)
+        self.assertEqual(report['dataset']['Order'], 40)
+        for scenario, summary in report['scenarios'].items():
+            with self.subTest(scenario=scenario):
+                self.assertEqual((summary['requests'], summary['errors']), (3, 0))
+                self.assertGreater(summary['latency_ms']['p95'], 0)
+                self.assertGreater(summary['queries']['mean'], 0)
+
+
+class SqliteBackendTests(SimpleTestCase):
+    """The connection hooks of store.backends.sqlite3, on a throwaway database file."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'hooks.sqlite3')
+
+    def connect(self):
+        db = SqliteDatabaseWrapper({**connection.settings_dict, 'NAME': self.path}, alias='hooks')
+        self.addCleanup(db.close)
+        return db
+
+    def pragma(self, db, name):
+        with db.cursor() as cursor:
+            cursor.execute('PRAGMA {}'.format(name))
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        db = self.connect()
+        self.assertEqual(self.pragma(db, 'busy_timeout'), settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(self.pragma(db, 'synchronous'), 1)  # NORMAL
+        # WAL is opt-in, it would convert the database file
+        self.assertEqual(self.pragma(db, 'journal_mode'), 'delete')
+        db.close()
+        with self.settings(SQLITE_WAL=True):
+            self.assertEqual(self.pragma(self.connect(), 'journal_mode'), 'wal')
+
+    def test_transactions_take_the_write_lock_up_front(self):
+        db = self.connect()
+        with db.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (id INTEGER PRIMARY KEY)')
+        other = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        self.addCleanup(other.close)
+        connections['hooks'] = db
+        self.addCleanup(connections.__delitem__, 'hooks')
+        with transaction.atomic(using='hooks'):
+            # Nothing written yet, but the lock is already held
+            with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+                other.execute('BEGIN IMMEDIATE')
+        other.execute('BEGIN IMMEDIATE')
+        other.execute('ROLLBACK')
+
+
+class SessionEngineTests(TestCase):
+    def setUp(self):
+        caches['sessions'].clear()
+
+    def session_queries(self, func):
+        with CaptureQueriesContext(connection) as ctx:
+            func()
+        return [q['sql'] for q in ctx.captured_queries if 'django_session' in q['sql']]
+
+    def test_authenticated_requests_read_the_cache(self):
+        self.client.force_login(User.objects.create_user('shopper', password='secret'))
+        self.client.get(reverse('store:cart'))
+        self.assertEqual(self.session_queries(lambda: self.client.get(reverse('store:cart'))), [])
+
+    def test_write_through_only_on_change(self):
+        store = CachedSessionStore()
+        store['cart'] = [1, 2]
+        store.create()
+        key = store.session_key
+
+        same = CachedSessionStore(key)
+        same['cart'] = [1, 2]
+        self.assertEqual(self.session_queries(same.save), [])
+
+        changed = CachedSessionStore(key)
+        changed['cart'].append(3)
+        changed.modified = True
+        self.assertEqual(len([sql for sql in self.session_queries(changed.save) if sql.startswith('UPDATE')]), 1)
+        # Another process, with an empty cache, reads the new data from the database
+        caches['sessions'].clear()
+        self.assertEqual(CachedSessionStore(key)['cart'], [1, 2, 3])
+
+    def test_cache_timeout_is_capped(self):
+        store = CachedSessionStore()
+        self.assertEqual(store.cache_timeout(3600), 60)
+        with self.settings(SESSION_CACHE_TIMEOUT=None):
+            self.assertEqual(store.cache_timeout(3600), 3600)
+
+    def test_purge_expired(self):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            [Session(session_key='old{}'.format(i), session_data='', expire_date=now - timedelta(days=1)) for i in range(5)]
+            + [Session(session_key='new{}'.format(i), session_data='', expire_date=now + timedelta(days=1)) for i in range(2)]
+        )
+        self.assertEqual(purge_expired(batch_size=2), 5)
+        self.assertEqual(sorted(Session.objects.values_list('session_key', flat=True)), ['new0', 'new1'])
+        out = StringIO()
+        call_command('purge_sessions', stdout=out)
+        self.assertIn('Deleted 0 expired sessions', out.getvalue())
+
+
+class StaticFilesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        source = os.path.join(cls.directory.name, 'source')
+        os.makedirs(os.path.join(source, 'css'))
+        with open(os.path.join(source, 'css', 'site.css'), 'w') as f:
+            f.write('body { background: url("../img/missing.png"); }\n' + '.rule { color: red; }\n' * 100)
+        with open(os.path.join(source, 'css', 'tiny.css'), 'w') as f:
+            f.write('a { color: red; }')
+        cls.overrides = override_settings(
+            STATICFILES_DIRS=[source],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STATIC_ROOT=os.path.join(cls.directory.name, 'root'),
+            STATICFILES_STORAGE='store.staticfiles.CompressedManifestStaticFilesStorage',
+        )
+        cls.overrides.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+        # Next to STATIC_ROOT, and reachable from it through a symlink
+        private = os.path.join(cls.directory.name, 'root-private')
+        os.makedirs(private)
+        with open(os.path.join(private, 'secret.txt'), 'w') as f:
+            f.write('secret')
+        os.symlink(private, os.path.join(cls.directory.name, 'root', 'linked'))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.overrides.disable()
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        # A new client, so the middleware is set up with the overridden settings
+        self.client = Client()
+        self.hashed = static('css/site.css')
+
+    def test_collectstatic_hashes_and_compresses(self):
+        self.assertRegex(self.hashed, r'^/static/css/site\.[0-9a-f]{12}\.css$')
+        root = os.path.join(self.directory.name, 'root', 'css')
+        self.assertTrue(os.path.isfile(os.path.join(root, os.path.basename(self.hashed) + '.gz')))
+        self.assertFalse(any(name.startswith('tiny.') and name.endswith('.gz') for name in os.listdir(root)))
+        # Files that were never collected keep their name
+        self.assertEqual(static('img/missing.png'), '/static/img/missing.png')
+
+    def test_gzip_and_immutable_caching(self):
+        response = self.client.get(self.hashed, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn(b'.rule', gzip.decompress(b''.join(response.streaming_content)))
+
+        plain = self.client.get(self.hashed, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertGreater(int(plain['Content-Length']), int(response['Content-Length']))
+
+        cached = self.client.get(self.hashed, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_unhashed_names_and_misses(self):
+        response = self.client.get('/static/css/site.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        for path in ('/static/../manage.py', '/static/css/nope.css', self.hashed + '.gz'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).status_code, 404)
+
+    def test_gzip_negotiation(self):
+        for accept, encoding in (
+            ('gzip', 'gzip'), ('deflate, GZIP;q=0.5', 'gzip'), ('*', 'gzip'), ('br, *;q=0.1', 'gzip'),
+            ('', None), ('identity', None), ('br', None), ('gzip;q=0', None), ('gzip; q=0.000, br', None), ('*;q=0', None),
+        ):
+            with self.subTest(accept=accept):
+                response = self.client.get(self.hashed, HTTP_ACCEPT_ENCODING=accept)
+                self.assertEqual(response.get('Content-Encoding'), encoding)
+                self.assertEqual(response['Vary'], 'Accept-Encoding')
+                response.close()
+        # Too small to compress, so the answer doesn't depend on the header
+        tiny = self.client.get(static('css/tiny.css'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(tiny.has_header('Content-Encoding') or tiny.has_header('Vary'))
+        tiny.close()
+
+    def test_conditional_and_head_requests(self):
+        response = self.client.get(self.hashed)
+        response.close()
+        for headers in ({'HTTP_IF_NONE_MATCH': response['ETag']}, {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']}):
+            with self.subTest(headers=headers):
+                cached = self.client.get(self.hashed, **headers)
+                self.assertEqual(cached.status_code, 304)
+                self.assertEqual((cached['ETag'], cached.content), (response['ETag'], b''))
+        # The gzip copy has its own ETag, which doesn't validate the plain file
+        gzipped = self.client.get(self.hashed, HTTP_ACCEPT_ENCODING='gzip')
+        gzipped.close()
+        self.assertNotEqual(gzipped['ETag'], response['ETag'])
+        plain = self.client.get(self.hashed, HTTP_IF_NONE_MATCH=gzipped['ETag'])
+        self.assertEqual(plain.status_code, 200)
+        plain.close()
+
+        head = self.client.head(self.hashed)
+        self.assertEqual((head.status_code, head.content), (200, b''))
+        self.assertEqual(head['Content-Length'], response['Content-Length'])
+        self.assertEqual(self.client.post(self.hashed).status_code, 404)
+
+    def test_no_way_out_of_static_root(self):
+        for path in (
+            '/static/css/../../manage.py', '/static/%2e%2e/manage.py', '/static/..%2froot-private/secret.txt',
+            '/static/../root-private/secret.txt', '/static/linked/secret.txt', '/static//etc/passwd', '/static/',
+        ):
+            with self.subTest(path=path):
+                self.assertIsNone(StaticFilesMiddleware(HttpResponse).respond(RequestFactory().get(path)))
+                self.assertEqual(self.client.get(path).status_code, 404)
+
+    def test_async_mode_and_debug(self):
+        async def app(request):
+            return HttpResponse('app')
+
+        middleware = StaticFilesMiddleware(app)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        served = async_to_sync(middleware)(AsyncRequestFactory().get(self.hashed))
+        self.assertIn(b'.rule', b''.join(served.streaming_content))
+        served.close()
+        self.assertEqual(async_to_sync(middleware)(AsyncRequestFactory().get('/static/nope.css')).content, b'app')
+        # runserver serves the source files itself
+        with self.settings(DEBUG=True), self.assertRaises(MiddlewareNotUsed):
+            StaticFilesMiddleware(app)
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        settings = override_settings(
+            MEDIA_ROOT=media.name, IMAGE_DERIVATIVE_WIDTHS=(160, 320), IMAGE_DERIVATIVES_ASYNC=False,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def original(self, name, size=(240, 120)):
+        os.makedirs(os.path.join(self.media_root, os.path.dirname(name)), exist_ok=True)
+        Image.new('RGB', size, 'gold').save(os.path.join(self.media_root, name), 'JPEG')
+        return name
+
+    def test_render_every_width_and_format(self):
+        name = self.original('product/ring-render.jpg')
+        self.assertEqual(render_derivatives(self.media_root, name, (160, 320), 80), 4)
+        for width, fmt, expected in ((160, 'jpeg', (160, 80)), (320, 'webp', (240, 120))):
+            with Image.open(os.path.join(self.media_root, derivative_name(name, width, fmt))) as image:
+                # Wider than the original is written at the original size
+                self.assertEqual(image.size, expected)
+        self.assertEqual(render_derivatives(self.media_root, name, (160, 320), 80), 0)
+        self.assertEqual(render_derivatives(self.media_root, name, (160, 320), 80, force=True), 4)
+
+    def test_saved_images_get_derivatives_after_commit(self):
+        name = self.original('product/ring-saved.jpg')
+        category = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=False)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Product.objects.create(
+                title='Ring', slug='ring', sku='R1', price=10, category=category, product_image=name,
+                is_active=True, is_featured=False,
+            )
+            self.assertFalse(derivatives_ready(name))
+        self.assertEqual(len(callbacks), 1)
+        self.assertTrue(derivatives_ready(name))
+
+    def test_failed_jobs_are_logged(self):
+        failed, done = Future(), Future()
+        failed.set_exception(OSError('cannot identify image file'))
+        done.set_result(4)
+        with self.assertLogs('store.images', 'ERROR') as logs:
+            log_failure('product/ring.jpg')(done)
+            log_failure('product/broken.jpg')(failed)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('product/broken.jpg', logs.output[0])
+
+
+class ProductCardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', password='secret')
+        cls.category = Category.objects.create(title='Rings', slug='rings', is_active=True, is_featured=False)
+        cls.products = [
+            Product.objects.create(
+                title='Ring {}'.format(i), slug='ring-{}'.format(i), sku='R{}'.format(i),
+                price=Decimal('10.00') + i, category=cls.category, is_active=True, is_featured=False,
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cards_are_cached_per_product_version(self):
+        product = self.products[0]
+        url = reverse('store:category-products', args=['rings'])
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(url), 'Shs. 10.00')
+        self.assertIsNotNone(cache.get(product_card_key(product)))
+
+        product.price = Decimal('12.50')
+        product.save()
+        ProductReview.objects.create(product=product, user=self.user, rating=4, comment='Nice')
+        response = self.client.get(url)
+        self.assertContains(response, 'Shs. 12.50 &middot;')
+        self.assertContains(response, '4.00 (1)')
+
+    def test_key_follows_the_card_template(self):
+        product = self.products[0]
+        card = get_card_template()
+        self.assertEqual(product_card_key(product), product_card_key(product, card))
+        # A deploy or runserver reload that edits the card must not serve the old markup
+        edited = Template(card.source.replace('Shs.', 'UGX'))
+        self.assertNotEqual(product_card_key(product, edited), product_card_key(product, card))
+
+    @override_settings(DEBUG=True)
+    def test_cached_with_debug(self):
+        # The shipped settings run with DEBUG = True, the runner forces it off
+        self.assertIsInstance(engines['django'].engine.template_loaders[0], CachedLoader)
+        self.client.force_login(self.user)
+        self.client.get(reverse('store:category-products', args=['rings']))
+        self.assertIsNotNone(cache.get(product_card_key(self.products[0])))
+
+    def test_related_and_wishlist_cards(self):
+        self.client.force_login(self.user)
+        wishlist = Wishlist.objects.create(user=self.user)
+        wishlist.products.add(self.products[1])
+        response = self.client.get(reverse('store:view_wishlist'))
+        self.assertContains(response, 'Ring 1')
+        self.assertContains(response, reverse('store:remove_from_wishlist', kwargs={'product_id': self.products[1].id}))
+
+        # Each related card links to its own product
+        response = self.client.get(reverse('store:product-detail', args=['ring-0']))
+        for related in self.products[1:]:
+            self.assertContains(response, reverse('store:add_to_wishlist', kwargs={'product_id': related.id}))
@@ -1,6 +1,6 @@
 from store.forms import LoginForm, PasswordChangeForm, PasswordResetForm, SetPasswordForm
 from django.urls import path
-from . import views
+from . import api, views
 from django.contrib.auth import views as auth_views
 
 
@@ -20,6 +20,7 @@ urlpatterns = [
     path('plus-cart/<int:cart_id>/', views.plus_cart, name="plus-cart"),
     path('minus-cart/<int:cart_id>/', views.minus_cart, name="minus-cart"),
     path('cart/', views.cart, name="cart"),
+    path('cart/badge/', views.cart_badge, name="cart-badge"),
     path('checkout/', views.checkout, name="checkout"),
     path('orders/', views.orders, name="orders"),
 
@@ -27,9 +28,16 @@ urlpatterns = [
     path('add_to_wishlist/<int:product_id>/', views.add_to_wishlist, name='add_to_wishlist'),
     path('remove_from_wishlist/<int:product_id>/', views.remove_from_wishlist, name='remove_from_wishlist'),
 
+    # Read-only JSON catalog
+    path('api/products/', api.product_list, name="api-products"),
+    path('api/products/<int:pk>/', api.product_detail, name="api-product"),
+    path('api/categories/', api.category_list, name="api-categories"),
+    path('api/categories/<int:pk>/', api.category_detail, name="api-category"),
+
     #URL for Products
     path('product/<slug:slug>/', views.detail, name="product-detail"),
     path('categories/', views.all_categories, name="all-categories"),
+    path('search/', views.search, name="search"),
     path('<slug:slug>/', views.category_products, name="category-products"),
 
 
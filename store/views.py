@@ -1,21 +1,28 @@
 from django.db import IntegrityError
+from django.db.models import F
 from django.contrib.auth.models import User
 from store.models import Address, Cart, Category, Order, Product, Wishlist, ContactMessage, BlogPost, Subscription
+from django.http import JsonResponse
 from django.shortcuts import redirect, render, get_object_or_404
+from .caching import cache_anonymous_page, get_cart_badge, invalidate_cart_badge
+from .cart import get_cart_summary
+from .checkout import place_order
+from .pagination import KeysetPaginator
+from . import popularity
+from .related import get_related_products
+from .search import search_products
 from .forms import RegistrationForm, AddressForm, CheckoutForm, ProductReviewForm, SubscriptionForm
 from django.contrib import messages
 from django.views import View
-import decimal
-from django.db.models import Avg
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator # for Class Based Views
-from django.core.paginator import Paginator
 
 
 
 
 # Create your views here.
 
+@cache_anonymous_page('catalog')
 def home(request):
     categories = Category.objects.filter(is_active=True, is_featured=True)[:3]
     products = Product.objects.filter(is_active=True, is_featured=True)[:8]
@@ -49,16 +56,14 @@ def home(request):
     
     return render(request, 'store/index.html', context)
 
+@cache_anonymous_page('catalog', on_hit=popularity.record_cached_detail_view)
 def detail(request, slug):
-    product = get_object_or_404(Product, slug=slug)
-    reviews = product.reviews.all()
-    related_products = Product.objects.exclude(id=product.id).filter(is_active=True, category=product.category)
+    product = get_object_or_404(Product.objects.select_related('category'), slug=slug)
+    reviews = product.reviews.select_related('user')
+    related_products = get_related_products(product)
     wishlist_count = 0
     if request.user.is_authenticated:
-        wishlist = Wishlist.objects.filter(user=request.user).first()
-        if wishlist:
-            products = wishlist.products.all()
-            wishlist_count = products.count()
+        wishlist_count = Wishlist.products.through.objects.filter(wishlist__user=request.user).count()
     if request.method == 'POST':
         review_form = ProductReviewForm(request.POST)
         if review_form.is_valid():
@@ -69,6 +74,7 @@ def detail(request, slug):
             review.save()
     else:
         review_form = ProductReviewForm()
+        popularity.record(product.id, 'detail_view')
 
     context = {
         'product': product,
@@ -83,11 +89,13 @@ def detail(request, slug):
 
 
 
+@cache_anonymous_page('catalog')
 def all_categories(request):
     categories = Category.objects.filter(is_active=True)
     return render(request, 'store/categories.html', {'categories':categories})
 
 
+@cache_anonymous_page('catalog')
 def category_products(request, slug):
     
     # Get the sorting parameter from the request
@@ -97,28 +105,37 @@ def category_products(request, slug):
     products = Product.objects.filter(is_active=True, category=category)
     categories = Category.objects.filter(is_active=True)
 
-# Implement sorting based on the 'sort_by' parameter
-    if sort_by == 'popularity':
-        products = products.order_by('-popularity')
-    elif sort_by == 'low-high':
-        products = products.order_by('price')
-    elif sort_by == 'high-low':
-        products = products.order_by('-price')
-
-    
-    paginator = Paginator(products, 12)  # Show 12 products per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination on the active sort, so deep pages cost the same as the first one
+    paginator = KeysetPaginator(products, sort_by, per_page=12, count_cache_key='store:category_count:{}'.format(category.id))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     context = {
         'category': category,
-        'products': products,
+        'products': page_obj.object_list,
         'categories': categories,
         'page_obj': page_obj,
+        'sort_by': sort_by,
     }
     return render(request, 'store/category_products.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        page_number = max(int(request.GET.get('page', 1)), 1)
+    except (ValueError, OverflowError):
+        page_number = 1
+
+    page_obj = search_products(query, page_number)
+
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'products': page_obj.products,
+    }
+    return render(request, 'store/search.html', context)
+
+
 # Authentication Starts Here
 
 class RegistrationView(View):
@@ -173,14 +190,14 @@ def add_to_cart(request):
     product_id = request.GET.get('prod_id')
     product = get_object_or_404(Product, id=product_id)
 
-    # Check whether the Product is alread in Cart or Not
-    item_already_in_cart = Cart.objects.filter(product=product_id, user=user)
-    if item_already_in_cart:
-        cp = get_object_or_404(Cart, product=product_id, user=user)
-        cp.quantity += 1
-        cp.save()
-    else:
-        Cart(user=user, product=product).save()
+    # get_or_create retries the read when a concurrent add (a double submit,
+    # another tab) inserted the line first, and F() keeps both increments
+    line, created = Cart.objects.get_or_create(user=user, product=product)
+    if not created:
+        Cart.objects.filter(id=line.id).update(quantity=F('quantity') + 1)
+        # update() sends no post_save
+        invalidate_cart_badge(user.id)
+    popularity.record(product.id, 'add_to_cart')
     
     return redirect('store:cart')
 
@@ -188,31 +205,31 @@ def add_to_cart(request):
 @login_required
 def cart(request):
     user = request.user
-    cart_products = Cart.objects.filter(user=user)
-
-    # Display Total on Cart Page
-    amount = decimal.Decimal(0)
-    shipping_amount = decimal.Decimal(10)
-    # using list comprehension to calculate total amount based on quantity and shipping
-    cp = [p for p in Cart.objects.all() if p.user==user]
-    if cp:
-        for p in cp:
-            temp_amount = (p.quantity * p.product.price)
-            amount += temp_amount
+
+    # Cart lines and totals come from a single query with the product joined
+    summary = get_cart_summary(user)
 
     # Customer Addresses
     addresses = Address.objects.filter(user=user)
 
     context = {
-        'cart_products': cart_products,
-        'amount': amount,
-        'shipping_amount': shipping_amount,
-        'total_amount': amount + shipping_amount,
+        'cart_products': summary.lines,
+        'amount': summary.subtotal,
+        'shipping_amount': summary.shipping_amount,
+        'total_amount': summary.total_amount,
         'addresses': addresses,
     }
     return render(request, 'store/cart.html', context)
 
 
+def cart_badge(request):
+    """Navbar cart badge as JSON, so cached pages can fill it in after load."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'count': 0, 'total': '0.00'})
+    badge = get_cart_badge(request.user.id)
+    return JsonResponse({'count': badge['count'], 'total': badge['total']})
+
+
 @login_required
 def remove_cart(request, cart_id):
     if request.method == 'GET':
@@ -248,40 +265,21 @@ def minus_cart(request, cart_id):
 def checkout(request):
     user = request.user
     if request.method == 'POST':
-        form = CheckoutForm(request.POST)
+        form = CheckoutForm(request.POST, user=user)
         if form.is_valid():
-            # Get the selected address ID from the form data
-            address_id = form.cleaned_data['address']
-            address = get_object_or_404(Address, id=address_id)
-
-            # Get all the products of the user in the cart
-            cart_items = Cart.objects.filter(user=user)
-
-            # Calculate the total amount
-            total_amount = sum(item.product.price * item.quantity for item in cart_items)
-
-            # Save all the products from the cart to orders
-            for cart_item in cart_items:
-                Order.objects.create(user=user, address=address, product=cart_item.product, quantity=cart_item.quantity)
-
-                # You can also update the inventory or perform other necessary actions here
-
-                # Delete the item from the cart after creating the order
-                cart_item.delete()
+            # Move all the products of the user's cart to orders in one transaction
+            place_order(user, form.cleaned_data['address'])
 
             # Redirect to the 'store:orders' URL after processing the checkout
             return redirect('store:orders')
 
     else:
-        form = CheckoutForm()
-
-        # Get all the products of the user in the cart
-        cart_items = Cart.objects.filter(user=user)
+        form = CheckoutForm(user=user)
 
-        # Calculate the total amount
-        total_amount = sum(item.product.price * item.quantity for item in cart_items)
+    # Get all the products of the user in the cart along with the total amount
+    summary = get_cart_summary(user)
 
-    return render(request, 'store/checkout.html', {'form': form, 'total_amount': total_amount, 'cart_items': cart_items})
+    return render(request, 'store/checkout.html', {'form': form, 'total_amount': summary.subtotal, 'cart_items': summary.lines})
 
 @login_required
 def orders(request):
@@ -312,8 +310,7 @@ def add_to_wishlist(request, product_id):
     wishlist, created = Wishlist.objects.get_or_create(user=request.user)
     wishlist.products.add(product)
     # Increment the popularity of the product when added to the wishlist
-    product.popularity += 1
-    product.save()
+    popularity.record(product.id, 'wishlist')
     return redirect('store:view_wishlist')
 
 @login_required
@@ -323,6 +320,7 @@ def remove_from_wishlist(request, product_id):
     wishlist.products.remove(product)
     return redirect('store:view_wishlist')
 
+@cache_anonymous_page('blog')
 def blog(request):
     blog_posts = BlogPost.objects.all()
     return render(request, 'store/blog.html', {'blog_posts': blog_posts})
@@ -36,6 +36,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'store.staticfiles.StaticFilesMiddleware',
+    'store.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -50,8 +52,15 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Every template is compiled once per process; runserver's
+            # autoreloader resets the cache when a template file changes
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -72,11 +81,90 @@ WSGI_APPLICATION = 'taffreen.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # django.db.backends.sqlite3 with tuned PRAGMAs and BEGIN IMMEDIATE transactions
+        'ENGINE': 'store.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests instead of reconnecting every time
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Seconds to wait for a lock before raising "database is locked"
+            'timeout': 20,
+        },
     }
 }
 
+# Switch the database to write-ahead logging on its first connection. The
+# change is written into the file itself, so it stays off for the db.sqlite3
+# checked into the repository; turn it on for deployed databases.
+SQLITE_WAL = False
+
+# PRAGMAs applied to each new SQLite connection (see store.db)
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'taffreen',
+    },
+    # Kept apart from the page cache so its churn never evicts sessions
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'taffreen-sessions',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+
+# The caches above are local to each process, while signals invalidate
+# entries only in the process that handled the write. Entries that writes
+# invalidate (menu, cart badges, pages, related products) therefore expire
+# after CACHE_STALE_TIMEOUT seconds at most, the longest another worker can
+# serve them stale. Use None with a shared backend such as Redis or memcached.
+CACHE_STALE_TIMEOUT = 60
+
+
+# Sessions are read from the sessions cache and written through to the
+# database only when they change (see store.sessions). Entries expire from
+# the cache after SESSION_CACHE_TIMEOUT seconds, the longest another
+# process can see a stale session while the cache is process-local; use
+# None with a shared cache. Expired rows are removed by purge_sessions.
+SESSION_ENGINE = 'store.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_CACHE_TIMEOUT = 60
+
+
+# Weights of the shopper signals that raise Product.popularity, buffered
+# in memory and written every POPULARITY_FLUSH_INTERVAL seconds
+POPULARITY_WEIGHTS = {
+    'detail_view': 1,
+    'add_to_cart': 3,
+    'wishlist': 5,
+    'purchase': 10,
+}
+POPULARITY_FLUSH_INTERVAL = 30
+
+
+# Request profiling (store.profiling): per-view timings of the last
+# PROFILING_WINDOW requests, shown at custom_admin/performance/. When
+# PROFILING_SLOW_LOG is a path, that share of the requests slower than
+# PROFILING_SLOW_MS is appended to it as JSON lines.
+PROFILING_ENABLED = True
+PROFILING_WINDOW = 1000
+PROFILING_DUPLICATE_MIN = 3
+PROFILING_SLOW_LOG = None
+PROFILING_SLOW_MS = 500
+PROFILING_SAMPLE_RATE = 0.1
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -118,10 +206,26 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'taffreen/static')]
 STATIC_ROOT = os.path.join(BASE_DIR, 'static') # Automatically Created on Production
 
+# Outside DEBUG, collectstatic writes content-hashed names plus .gz copies,
+# and store.staticfiles.StaticFilesMiddleware serves STATIC_ROOT with
+# immutable caching for hashed names and STATIC_MAX_AGE seconds otherwise.
+if DEBUG:
+    STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+else:
+    STATICFILES_STORAGE = 'store.staticfiles.CompressedManifestStaticFilesStorage'
+STATIC_MAX_AGE = 60
+
 # Settings for Media
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Resized JPEG/WebP copies of uploaded images, written under MEDIA_ROOT/derivatives
+# by a process pool (see store.images and the build_image_derivatives command)
+IMAGE_DERIVATIVE_WIDTHS = (160, 320, 640, 1024)
+IMAGE_DERIVATIVE_QUALITY = 80
+IMAGE_DERIVATIVE_WORKERS = 2
+IMAGE_DERIVATIVES_ASYNC = True
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 